@@ -4,54 +4,96 @@ High-level search over constraints
 Low-level replanning with Space-Time A*
 """
 import time
-from typing import Dict, Any, List, Set, Tuple, Optional
-from queue import PriorityQueue
+from typing import Dict, Any, List, Tuple, Optional, FrozenSet
+import heapq
+import itertools
+import numpy as np
 from dataclasses import dataclass, field
 import sys
 sys.path.append('..')
-from utils import Agent
-from .space_time_astar import space_time_astar
-from .independent_astar import detect_conflicts
+from utils import Agent, as_grid, build_neighbors_table
+from .space_time_astar import (
+    space_time_astar, encode_state, sorted_keys, build_true_distance_heuristic, NUMBA_AVAILABLE
+)
+from .independent_astar import summarize_conflicts
+
+# Persistent constraint list: (parent_chain, (agent_id, x, y, t)), root is None.
+# Children share their parent's chain instead of copying a growing set.
+ConstraintChain = Optional[Tuple[Any, Tuple[int, int, int, int]]]
+
+# (agent_index, encoded constraint keys) -> (path, cost), or None if no path exists
+PathCache = Dict[Tuple[int, FrozenSet[int]], Optional[Tuple[List[List[int]], int]]]
+
+# Canonical instance of each per-agent constraint set seen in this search
+ConstraintPool = Dict[FrozenSet[int], FrozenSet[int]]
 
 @dataclass
 class CBSNode:
-    """High-level CBS node"""
-    constraints: Set[Tuple[int, int, int, int]]  # (agent_id, x, y, t)
+    """
+    High-level CBS node
+    
+    Path lists are never mutated after construction, so children share
+    every unchanged path with their parent by reference.
+    """
+    constraints: ConstraintChain  # (agent_id, x, y, t) deltas back to the root
     paths: List[List[List[int]]]
     cost: int  # Sum of costs
-    
-    def __lt__(self, other):
-        return self.cost < other.cost
+    num_conflicts: int = 0  # Conflicts between paths, the open-list tiebreak
+    first_conflict: Optional[Dict[str, Any]] = None  # The conflict to split on
 
 def cbs(
     agents: List[Agent],
     blocks: List[List[bool]],
     size: int,
     max_time: int = 100,
-    max_iterations: int = 1000
+    max_iterations: int = 1000,
+    cost_upper_bound: Optional[int] = None
 ) -> Dict[str, Any]:
     """
     Conflict-Based Search
     
     Args:
         agents: List of agents
-        blocks: 2D grid of obstacles
+        blocks: 2D grid of obstacles (nested lists or array; converted
+            with as_grid)
         size: Grid size
         max_time: Maximum time horizon
         max_iterations: Maximum CBS iterations
+        cost_upper_bound: Optional known sum-of-costs bound (e.g. from a
+            feasible solution); nodes costing this much or more are pruned
+            and child replans are bounded accordingly
     
     Returns:
         Dictionary with paths for all agents and metrics
     """
     start_time = time.time()
+    blocks = as_grid(blocks)
+    
+    # Low-level paths memoized per agent and constraint set for this search
+    path_cache: PathCache = {}
+    # Equal constraint sets reached from different branches are interned to
+    # one object, so path-cache lookups match on identity
+    constraint_pool: ConstraintPool = {}
+    
+    # True-distance heuristics depend only on each agent's goal and the move
+    # table only on the grid, so both are computed once for every replan.
+    # Only the pure-Python search reads the move table.
+    neighbors_table = None if NUMBA_AVAILABLE else build_neighbors_table(blocks, size)
+    heuristic_table = [
+        build_true_distance_heuristic(agent.goal, blocks, size, neighbors_table)
+        for agent in agents
+    ]
     
     # Initialize root node with independent planning
     root_paths = []
     total_cost = 0
     
-    for agent in agents:
-        result = space_time_astar(agent, blocks, size, max_time)
-        if result["path"] is None:
+    for agent_index in range(len(agents)):
+        planned = plan_path(
+            agents, blocks, size, max_time, agent_index, frozenset(),
+            path_cache, heuristic_table, neighbors_table
+        )
+        if planned is None:
             return {
                 "paths": None,
                 "exploration_orders": [],
@@ -66,31 +108,53 @@ def cbs(
                 },
                 "conflicts": []
             }
-        root_paths.append(result["path"])
-        total_cost += result["metrics"]["path_length"]
+        root_paths.append(planned[0])
+        total_cost += planned[1]
     
+    if cost_upper_bound is not None and total_cost >= cost_upper_bound:
+        # Every CBS node costs at least as much as the root
+        return {
+            "paths": None,
+            "exploration_orders": [],
+            "metrics": {
+                "explored_size": 0,
+                "time_taken_ms": (time.time() - start_time) * 1000,
+                "success": False,
+                "num_conflicts": 0,
+                "sum_of_costs": 0,
+                "makespan": 0,
+                "cbs_iterations": 0
+            },
+            "conflicts": []
+        }
+    
+    num_conflicts, first_conflict = summarize_conflicts(root_paths)
     root_node = CBSNode(
-        constraints=set(),
+        constraints=None,
         paths=root_paths,
-        cost=total_cost
+        cost=total_cost,
+        num_conflicts=num_conflicts,
+        first_conflict=first_conflict
     )
     
-    # High-level search
-    open_list = PriorityQueue()
-    open_list.put((root_node.cost, id(root_node), root_node))
+    # High-level search. Cost ties go to the node with fewer conflicts, then
+    # to the earliest generated, so the search is deterministic across runs.
+    open_list = []
+    counter = itertools.count()
+    heapq.heappush(open_list, (root_node.cost, root_node.num_conflicts, next(counter), root_node))
     
     iterations = 0
     nodes_expanded = 0
     
-    while not open_list.empty() and iterations < max_iterations:
+    while open_list and iterations < max_iterations:
         iterations += 1
-        _, _, current_node = open_list.get()
+        *_, current_node = heapq.heappop(open_list)
         nodes_expanded += 1
         
-        # Detect conflicts
-        conflicts = detect_conflicts(current_node.paths)
+        # First conflict, found when the node was built
+        conflict = current_node.first_conflict
         
-        if not conflicts:
+        if conflict is None:
             # Solution found!
             max_makespan = max(len(path) - 1 for path in current_node.paths)
             
@@ -111,9 +175,6 @@ def cbs(
                 "conflicts": []
             }
         
-        # Pick first conflict
-        conflict = conflicts[0]
-        
         # Generate two child nodes
         if conflict["type"] == "vertex":
             agent_a, agent_b = conflict["agents"]
@@ -121,24 +182,26 @@ def cbs(
             x, y = conflict["location"]
             
             # Child 1: constrain agent A
-            child1_constraints = current_node.constraints.copy()
-            child1_constraints.add((agent_a, x, y, t))
+            child1_constraints = (current_node.constraints, (agent_a, x, y, t))
             child1 = create_child_node(
                 agents, blocks, size, max_time,
-                child1_constraints, current_node.paths, agent_a
+                child1_constraints, current_node.paths, current_node.cost,
+                agent_a, path_cache, constraint_pool,
+                heuristic_table, neighbors_table, cost_upper_bound
             )
             if child1 is not None:
-                open_list.put((child1.cost, id(child1), child1))
+                heapq.heappush(open_list, (child1.cost, child1.num_conflicts, next(counter), child1))
             
             # Child 2: constrain agent B
-            child2_constraints = current_node.constraints.copy()
-            child2_constraints.add((agent_b, x, y, t))
+            child2_constraints = (current_node.constraints, (agent_b, x, y, t))
             child2 = create_child_node(
                 agents, blocks, size, max_time,
-                child2_constraints, current_node.paths, agent_b
+                child2_constraints, current_node.paths, current_node.cost,
+                agent_b, path_cache, constraint_pool,
+                heuristic_table, neighbors_table, cost_upper_bound
             )
             if child2 is not None:
-                open_list.put((child2.cost, id(child2), child2))
+                heapq.heappush(open_list, (child2.cost, child2.num_conflicts, next(counter), child2))
         
         elif conflict["type"] == "edge":
             # For edge conflicts, add vertex constraints at both positions
@@ -149,24 +212,26 @@ def cbs(
             x2, y2 = pos2
             
             # Child 1: constrain agent A from moving to pos2 at time t
-            child1_constraints = current_node.constraints.copy()
-            child1_constraints.add((agent_a, x2, y2, t))
+            child1_constraints = (current_node.constraints, (agent_a, x2, y2, t))
             child1 = create_child_node(
                 agents, blocks, size, max_time,
-                child1_constraints, current_node.paths, agent_a
+                child1_constraints, current_node.paths, current_node.cost,
+                agent_a, path_cache, constraint_pool,
+                heuristic_table, neighbors_table, cost_upper_bound
             )
             if child1 is not None:
-                open_list.put((child1.cost, id(child1), child1))
+                heapq.heappush(open_list, (child1.cost, child1.num_conflicts, next(counter), child1))
             
             # Child 2: constrain agent B from moving to pos1 at time t
-            child2_constraints = current_node.constraints.copy()
-            child2_constraints.add((agent_b, x1, y1, t))
+            child2_constraints = (current_node.constraints, (agent_b, x1, y1, t))
             child2 = create_child_node(
                 agents, blocks, size, max_time,
-                child2_constraints, current_node.paths, agent_b
+                child2_constraints, current_node.paths, current_node.cost,
+                agent_b, path_cache, constraint_pool,
+                heuristic_table, neighbors_table, cost_upper_bound
             )
             if child2 is not None:
-                open_list.put((child2.cost, id(child2), child2))
+                heapq.heappush(open_list, (child2.cost, child2.num_conflicts, next(counter), child2))
     
     # No solution found within iteration limit
     metrics = {
@@ -188,43 +253,110 @@ def cbs(
 
 def create_child_node(
     agents: List[Agent],
-    blocks: List[List[bool]],
+    blocks: np.ndarray,
     size: int,
     max_time: int,
-    constraints: Set[Tuple[int, int, int, int]],
+    constraints: ConstraintChain,
     parent_paths: List[List[List[int]]],
-    replan_agent_id: int
+    parent_cost: int,
+    replan_agent_id: int,
+    path_cache: PathCache,
+    constraint_pool: ConstraintPool,
+    heuristic_table: List[np.ndarray],
+    neighbors_table: Optional[List[Tuple[int, ...]]],
+    cost_upper_bound: Optional[int] = None
 ) -> Optional[CBSNode]:
     """
     Create child CBS node by replanning one agent with new constraints
     """
-    # Convert constraints for the specific agent
+    # Walk the constraint chain, keeping only the replanned agent's
+    # constraints as encoded state keys
     agent_constraints = set()
-    for agent_id, x, y, t in constraints:
+    link = constraints
+    while link is not None:
+        link, (agent_id, x, y, t) = link
         if agent_id == replan_agent_id:
-            agent_constraints.add((x, y, t))
+            agent_constraints.add(encode_state(x, y, t, size))
+    agent_constraints = frozenset(agent_constraints)
+    agent_constraints = constraint_pool.setdefault(agent_constraints, agent_constraints)
+    
+    # The replanned path must keep the node under the sum-of-costs bound
+    old_agent_cost = len(parent_paths[replan_agent_id]) - 1
+    agent_bound = None
+    if cost_upper_bound is not None:
+        agent_bound = cost_upper_bound - (parent_cost - old_agent_cost)
     
     # Replan this agent
-    result = space_time_astar(
-        agents[replan_agent_id],
-        blocks,
-        size,
-        max_time,
-        constraints=agent_constraints
+    planned = plan_path(
+        agents, blocks, size, max_time,
+        replan_agent_id, agent_constraints, path_cache,
+        heuristic_table, neighbors_table, cost_upper_bound=agent_bound
     )
     
-    if result["path"] is None:
+    if planned is None:
         return None  # No valid path with these constraints
     
-    # Create new paths list
+    # Create new paths list (shallow copy; unchanged paths are shared)
     new_paths = parent_paths.copy()
-    new_paths[replan_agent_id] = result["path"]
+    new_paths[replan_agent_id] = planned[0]
     
-    # Calculate total cost
-    total_cost = sum(len(path) - 1 for path in new_paths)
+    # Update total cost incrementally: only the replanned agent changed
+    total_cost = parent_cost - old_agent_cost + planned[1]
     
+    num_conflicts, first_conflict = summarize_conflicts(new_paths)
     return CBSNode(
         constraints=constraints,
         paths=new_paths,
-        cost=total_cost
+        cost=total_cost,
+        num_conflicts=num_conflicts,
+        first_conflict=first_conflict
+    )
+
+def plan_path(
+    agents: List[Agent],
+    blocks: np.ndarray,
+    size: int,
+    max_time: int,
+    agent_index: int,
+    agent_constraints: FrozenSet[int],
+    path_cache: PathCache,
+    heuristic_table: List[np.ndarray],
+    neighbors_table: Optional[List[Tuple[int, ...]]],
+    cost_upper_bound: Optional[int] = None
+) -> Optional[Tuple[List[List[int]], int]]:
+    """
+    Low-level plan for one agent, memoized on its constraint set
+    
+    Sibling CBS nodes often replan an agent under a constraint set that was
+    already solved elsewhere in the tree; those lookups skip the A* call.
+    
+    Returns:
+        (path, cost), or None if no path satisfies the constraints with
+        cost below cost_upper_bound
+    """
+    key = (agent_index, agent_constraints)
+    if key in path_cache:
+        planned = path_cache[key]
+        if planned is not None and cost_upper_bound is not None and planned[1] >= cost_upper_bound:
+            return None
+        return planned
+    
+    # Hand the planner the constraints already encoded as a sorted key array
+    result = space_time_astar(
+        agents[agent_index],
+        blocks,
+        size,
+        max_time,
+        constraints=sorted_keys(agent_constraints),
+        cost_upper_bound=cost_upper_bound,
+        h_table=heuristic_table[agent_index],
+        neighbors_table=neighbors_table
     )
+    path = result["path"]
+    if path is not None:
+        # A found path is optimal for these constraints whatever the bound
+        path_cache[key] = (path, len(path) - 1)
+    elif cost_upper_bound is None:
+        # Only an unbounded failure proves no path exists at all
+        path_cache[key] = None
+    return path_cache.get(key)
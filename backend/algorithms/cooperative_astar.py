@@ -3,38 +3,50 @@ Cooperative A* / Prioritized Planning with Reservation Table
 Plan agents one-by-one, reserving space-time cells
 """
 import time
-from typing import Dict, Any, List, Set, Tuple
+from typing import Dict, Any, List, Set
 import sys
 sys.path.append('..')
-from utils import Agent, manhattan_distance
-from .space_time_astar import space_time_astar
+from utils import Agent, manhattan_distance, as_grid, encode_cell, build_neighbors_table
+from .space_time_astar import space_time_astar, NUMBA_AVAILABLE
 
 def cooperative_astar(
     agents: List[Agent],
     blocks: List[List[bool]],
     size: int,
     max_time: int = 100,
-    priority_policy: str = "distance_first"
+    priority_policy: str = "distance_first",
+    track_exploration: bool = True
 ) -> Dict[str, Any]:
     """
     Cooperative A* with Reservation Table (Prioritized Planning)
     
     Args:
         agents: List of agents
-        blocks: 2D grid of obstacles
+        blocks: 2D grid of obstacles (nested lists or array; converted
+            with as_grid)
         size: Grid size
         max_time: Maximum time horizon
         priority_policy: "distance_first", "id_order", or "random"
+        track_exploration: Collect per-agent exploration orders for the
+            visualization; callers that only need paths can turn it off
     
     Returns:
         Dictionary with paths for all agents and metrics
     """
     start_time = time.time()
+    blocks = as_grid(blocks)
     
     # Sort agents by priority policy
     sorted_agents = sort_agents_by_priority(agents, priority_policy)
     
-    reservation_table: Set[Tuple[int, int, int]] = set()
+    # Grid adjacency is the same for every agent's search (read only by the
+    # pure-Python search)
+    neighbors_table = None if NUMBA_AVAILABLE else build_neighbors_table(blocks, size)
+    
+    # Conflict detection table: reserved timestamps per cell, plus the time
+    # from which a cell is reserved forever (an agent parked at its goal)
+    reservations: List[Set[int]] = [set() for _ in range(size * size)]
+    goal_from_time: Dict[int, int] = {}
     all_paths = []
     all_exploration_orders = []
     total_nodes_expanded = 0
@@ -48,7 +60,10 @@ def cooperative_astar(
             blocks, 
             size, 
             max_time,
-            reservation_table=reservation_table
+            reservations=reservations,
+            goal_from_time=goal_from_time,
+            neighbors_table=neighbors_table,
+            track_exploration=track_exploration
         )
         
         if result["path"] is None:
@@ -72,12 +87,12 @@ def cooperative_astar(
         path = result["path"]
         for step in path:
             x, y, t = step
-            reservation_table.add((x, y, t))
+            reservations[encode_cell(x, y, size)].add(t)
         
         # Also reserve goal position for all future times
-        goal_pos = path[-1]
-        for t in range(goal_pos[2] + 1, max_time):
-            reservation_table.add((goal_pos[0], goal_pos[1], t))
+        goal_x, goal_y, goal_t = path[-1]
+        goal_cell = encode_cell(goal_x, goal_y, size)
+        goal_from_time[goal_cell] = min(goal_t + 1, goal_from_time.get(goal_cell, goal_t + 1))
         
         all_paths.append(path)
         all_exploration_orders.append(result["exploration_order"])
@@ -4,31 +4,63 @@ Each agent plans independently ignoring others
 Shows why coordination is needed (collisions occur)
 """
 import time
-from typing import Dict, Any, List
+import os
+import threading
+from itertools import chain
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
 import sys
 sys.path.append('..')
-from utils import Agent
-from .space_time_astar import space_time_astar
+from utils import Agent, as_grid, build_neighbors_table
+from .space_time_astar import space_time_astar, NUMBA_AVAILABLE
+
+# Below this many grid cells * agents, dispatching to the pool costs more
+# than the searches themselves (measured break-even is around 100x100)
+PARALLEL_MIN_WORK = 50_000
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+
+def _shared_executor() -> Executor:
+    """Per-process search pool, created on first use and reused by later calls"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            pool = ThreadPoolExecutor if NUMBA_AVAILABLE else ProcessPoolExecutor
+            _executor = pool(max_workers=os.cpu_count() or 1)
+        return _executor
 
 def independent_astar(
     agents: List[Agent],
     blocks: List[List[bool]],
     size: int,
-    max_time: int = 100
+    max_time: int = 100,
+    parallel: bool = True,
+    track_exploration: bool = True
 ) -> Dict[str, Any]:
     """
     Independent A* - each agent plans without coordination
     
     Args:
         agents: List of agents
-        blocks: 2D grid of obstacles
+        blocks: 2D grid of obstacles (nested lists or array; converted
+            with as_grid)
         size: Grid size
         max_time: Maximum time horizon
+        parallel: Run the per-agent searches concurrently on a shared pool
+            (threads with the GIL-free Numba kernel, processes otherwise)
+            when there are more than two agents and at least
+            PARALLEL_MIN_WORK cells * agents
+        track_exploration: Collect per-agent exploration orders for the
+            visualization; callers that only need paths can turn it off
     
     Returns:
         Dictionary with paths for all agents and metrics
     """
     start_time = time.time()
+    blocks = as_grid(blocks)
     
     all_paths = []
     all_exploration_orders = []
@@ -37,10 +69,21 @@ def independent_astar(
     max_makespan = 0
     conflicts = []
     
-    # Plan for each agent independently
-    for agent in agents:
-        result = space_time_astar(agent, blocks, size, max_time)
-        
+    # Grid adjacency is the same for every agent's search (read only by the
+    # pure-Python search)
+    neighbors_table = None if NUMBA_AVAILABLE else build_neighbors_table(blocks, size)
+    
+    # Plan for each agent independently; searches share no state
+    search = partial(
+        space_time_astar, blocks=blocks, size=size, max_time=max_time,
+        neighbors_table=neighbors_table, track_exploration=track_exploration
+    )
+    if parallel and len(agents) > 2 and size * size * len(agents) >= PARALLEL_MIN_WORK:
+        results = list(_shared_executor().map(search, agents))
+    else:
+        results = map(search, agents)
+    
+    for result in results:
         if result["path"] is None:
             # Agent failed to find path
             return {
@@ -87,52 +130,119 @@ def detect_conflicts(paths: List[List[List[int]]]) -> List[Dict[str, Any]]:
     Detect vertex and edge conflicts between agent paths
     
     Returns:
-        List of conflict dictionaries
+        List of conflict dictionaries, ordered by time with vertex
+        conflicts before edge conflicts
     """
-    conflicts = []
+    return [conflict_dict(paths, found) for found in find_conflicts(paths)]
+
+def detect_first_conflict(paths: List[List[List[int]]]) -> Optional[Dict[str, Any]]:
+    """
+    Return the first conflict detect_conflicts would report, or None
+    
+    Only the earliest conflict is turned into a dictionary, which is all
+    CBS needs.
+    """
+    return summarize_conflicts(paths)[1]
+
+def summarize_conflicts(paths: List[List[List[int]]]) -> Tuple[int, Optional[Dict[str, Any]]]:
+    """
+    Number of conflicts detect_conflicts would report, and the first one
+    
+    Both come from one find_conflicts pass, so CBS can rank a node and
+    later split on its first conflict without scanning the paths twice.
+    """
+    found = find_conflicts(paths, sort=False)
+    if not found:
+        return 0, None
+    return len(found), conflict_dict(paths, min(found, key=_conflict_order))
+
+def find_conflicts(paths: List[List[List[int]]], sort: bool = True) -> List[Tuple[int, int, int, int]]:
+    """
+    Vertex and edge conflicts as (t, kind, agent_a, agent_b) tuples
+    
+    Paths are stacked into an (A, T) array of cell ids and compared with
+    NumPy. An agent stops occupying cells once its path ends; padded steps
+    get a per-agent negative sentinel so they never match anything.
+    kind is 0 for a vertex conflict and 1 for an edge conflict.
+    """
+    found = []
     
     if not paths or len(paths) < 2:
-        return conflicts
-    
-    # Find max time
-    max_time = max(len(path) for path in paths)
-    
-    for t in range(max_time):
-        # Vertex conflicts: two agents at same position at same time
-        positions_at_t = {}
-        for agent_id, path in enumerate(paths):
-            if t < len(path):
-                pos = tuple(path[t][:2])  # (x, y)
-                if pos in positions_at_t:
-                    conflicts.append({
-                        "type": "vertex",
-                        "agents": [positions_at_t[pos], agent_id],
-                        "time": t,
-                        "location": list(pos)
-                    })
-                else:
-                    positions_at_t[pos] = agent_id
-        
-        # Edge conflicts: two agents swap positions
-        if t > 0:
-            for i in range(len(paths)):
-                for j in range(i + 1, len(paths)):
-                    if t < len(paths[i]) and t < len(paths[j]):
-                        # Agent i: prev_i -> curr_i
-                        prev_i = tuple(paths[i][t-1][:2])
-                        curr_i = tuple(paths[i][t][:2])
-                        
-                        # Agent j: prev_j -> curr_j
-                        prev_j = tuple(paths[j][t-1][:2])
-                        curr_j = tuple(paths[j][t][:2])
-                        
-                        # Check for swap
-                        if prev_i == curr_j and prev_j == curr_i:
-                            conflicts.append({
-                                "type": "edge",
-                                "agents": [i, j],
-                                "time": t,
-                                "edge": [list(prev_i), list(curr_i)]
-                            })
-    
-    return conflicts
+        return found
+    
+    num_agents = len(paths)
+    lengths = np.fromiter(map(len, paths), dtype=np.int64, count=num_agents)
+    max_time = int(lengths.max())
+    if max_time == 0:
+        return found
+    
+    # All [x, y, t] steps in one (N, 3) array; t doubles as the step index
+    steps = np.fromiter(
+        chain.from_iterable(chain.from_iterable(paths)), dtype=np.int64, count=3 * int(lengths.sum())
+    ).reshape(-1, 3)
+    width = int(steps[:, 1].max()) + 1
+    cells = steps[:, 0] * width + steps[:, 1]
+    
+    # positions[a, t] = x * width + y, or -(a + 1) after agent a's path ends
+    positions = np.repeat(-(np.arange(num_agents, dtype=np.int64) + 1)[:, None], max_time, axis=1)
+    positions[np.repeat(np.arange(num_agents), lengths), steps[:, 2]] = cells
+    
+    # Vertex conflicts: two agents at same position at same time. A stable
+    # sort along the agent axis groups equal cells in agent order; each
+    # later member of a group conflicts with the group's first agent.
+    order = np.argsort(positions, axis=0, kind='stable')
+    ranked = np.take_along_axis(positions, order, axis=0)
+    duplicate = np.zeros_like(ranked, dtype=bool)
+    duplicate[1:] = ranked[1:] == ranked[:-1]
+    group_start = np.where(duplicate, 0, np.arange(num_agents)[:, None])
+    group_start = np.maximum.accumulate(group_start, axis=0)
+    for k, t in zip(*np.nonzero(duplicate)):
+        found.append((int(t), 0, int(order[group_start[k, t], t]), int(order[k, t])))
+    
+    # Edge conflicts: agents i < j swap cells between t-1 and t, i.e. i's
+    # move (prev, curr) equals j's move reversed. Moves are keyed by
+    # (t, prev, curr) and matched by binary search instead of comparing
+    # every pair of agents.
+    if max_time > 1:
+        prev, curr = positions[:, :-1], positions[:, 1:]
+        agent_ids, t_ids = np.nonzero((prev >= 0) & (curr >= 0))
+        p, c = prev[agent_ids, t_ids], curr[agent_ids, t_ids]
+        span = int(positions.max()) + 1
+        forward = (t_ids * span + p) * span + c
+        backward = (t_ids * span + c) * span + p
+        by_forward = np.argsort(forward, kind='stable')
+        sorted_forward = forward[by_forward]
+        lo = np.searchsorted(sorted_forward, backward, side='left')
+        hi = np.searchsorted(sorted_forward, backward, side='right')
+        for j_move in np.nonzero(hi > lo)[0]:
+            j = int(agent_ids[j_move])
+            for i_move in by_forward[lo[j_move]:hi[j_move]]:
+                i = int(agent_ids[i_move])
+                if i < j:
+                    found.append((int(t_ids[j_move]) + 1, 1, i, j))
+    
+    if sort:
+        found.sort(key=_conflict_order)
+    return found
+
+def _conflict_order(found: Tuple[int, int, int, int]) -> Tuple[int, int, int, int]:
+    """Report order: time, vertex before edge, then the original scan order"""
+    t, kind, a, b = found
+    return (t, kind, b if kind == 0 else a, b)
+
+def conflict_dict(paths: List[List[List[int]]], found: Tuple[int, int, int, int]) -> Dict[str, Any]:
+    """Expand a find_conflicts tuple into the API conflict dictionary"""
+    t, kind, a, b = found
+    if kind == 0:
+        return {
+            "type": "vertex",
+            "agents": [a, b],
+            "time": t,
+            "location": list(paths[b][t][:2])
+        }
+    return {
+        "type": "edge",
+        "agents": [a, b],
+        "time": t,
+        "edge": [list(paths[a][t - 1][:2]), list(paths[a][t][:2])]
+    }
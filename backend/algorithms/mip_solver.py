@@ -5,9 +5,13 @@ Time-expanded network with binary variables
 """
 from typing import Dict, Any, List, Optional, Tuple
 import time as time_module
+import numpy as np
 import sys
 sys.path.append('..')
-from utils import Agent, Pair
+from utils import Agent, Pair, as_grid, flat_grid, is_safe, decode_cell, encode_cell, build_neighbors_table
+from .cooperative_astar import cooperative_astar
+from .space_time_astar import build_true_distance_heuristic
+from .independent_astar import detect_conflicts
 
 try:
     from pulp import *
@@ -15,6 +19,9 @@ try:
 except ImportError:
     PULP_AVAILABLE = False
 
+# Overall CBC time budget in seconds, shared by all lazy-constraint rounds
+MIP_TIME_LIMIT = 30
+
 def mip_solver(
     agents: List[Agent],
     blocks: List[List[bool]],
@@ -26,7 +33,8 @@ def mip_solver(
     
     Args:
         agents: List of agents
-        blocks: 2D grid of obstacles
+        blocks: 2D grid of obstacles (nested lists or array; converted
+            with as_grid)
         size: Grid size
         max_time: Time horizon (keep small for feasibility)
     
@@ -51,120 +59,191 @@ def mip_solver(
             "conflicts": []
         }
     
+    blocks = as_grid(blocks)
+    blocks_flat = flat_grid(blocks)
+    neighbors_table = build_neighbors_table(blocks, size)
+    
+    # Reachability pre-solve: agent i can only be at v at time t if it can
+    # get there from its start by t and still reach its goal by max_time.
+    # Obstacle-aware BFS distances prune strictly more than Manhattan.
+    start_dist = [
+        build_true_distance_heuristic(agent.start, blocks, size, neighbors_table)
+        for agent in agents
+    ]
+    goal_dist = [
+        build_true_distance_heuristic(agent.goal, blocks, size, neighbors_table)
+        for agent in agents
+    ]
+    
+    for i, agent in enumerate(agents):
+        if (not is_safe(agent.start.first, agent.start.second, size, blocks_flat)
+                or not is_safe(agent.goal.first, agent.goal.second, size, blocks_flat)
+                or goal_dist[i][agent.start.first, agent.start.second] > max_time):
+            return {
+                "paths": None,
+                "exploration_orders": [],
+                "metrics": {
+                    "explored_size": 0,
+                    "time_taken_ms": (time_module.time() - start_time_exec) * 1000,
+                    "success": False,
+                    "num_conflicts": 0,
+                    "sum_of_costs": 0,
+                    "makespan": 0,
+                    "status": "Infeasible"
+                },
+                "conflicts": []
+            }
+    
     # Create MIP problem
     prob = LpProblem("MAPF_MIP", LpMinimize)
     
-    # Decision variables: x[i][v][t] = 1 if agent i at position v at time t
+    # Decision variables: x[i][v][t] = 1 if agent i at position v at time t,
+    # created only for (v, t) pairs that survive the reachability pre-solve
     x = {}
+    num_variables = 0
     for i, agent in enumerate(agents):
         x[i] = {}
+        d_start_rows = start_dist[i].tolist()
+        d_goal_rows = goal_dist[i].tolist()
         for r in range(size):
             for c in range(size):
-                if not blocks[r][c]:
+                if not blocks_flat[r * size + c]:
                     v = (r, c)
+                    d_start = d_start_rows[r][c]
+                    d_goal = d_goal_rows[r][c]
+                    times = range(d_start, max_time - d_goal + 1)
+                    if len(times) == 0:
+                        continue
                     x[i][v] = {}
-                    for t in range(max_time + 1):
+                    for t in times:
                         x[i][v][t] = LpVariable(f"x_{i}_{r}_{c}_{t}", cat='Binary')
+                    num_variables += len(times)
     
-    # Objective: minimize sum of costs (total timesteps)
+    # Objective: minimize sum of costs. Each agent must sit at its goal by
+    # max_time and never leaves it, so its cost is the number of timesteps
+    # it is not at the goal; minimizing that maximizes time spent at goal.
     prob += lpSum([
-        t * x[i][v][t]
-        for i in range(len(agents))
-        for v in x[i]
-        for t in range(max_time + 1)
-        if v == (agents[i].goal.first, agents[i].goal.second)
+        -x[i][(agent.goal.first, agent.goal.second)][t]
+        for i, agent in enumerate(agents)
+        for t in x[i].get((agent.goal.first, agent.goal.second), {})
     ])
     
     # Constraints
     for i, agent in enumerate(agents):
         # Start position
         start_v = (agent.start.first, agent.start.second)
-        if start_v in x[i]:
-            prob += x[i][start_v][0] == 1
+        prob += x[i][start_v][0] == 1
         
         # Each agent at exactly one position per timestep
         for t in range(max_time + 1):
-            prob += lpSum([x[i][v][t] for v in x[i]]) == 1
+            prob += lpSum([x[i][v][t] for v in x[i] if t in x[i][v]]) == 1
         
         # Flow conservation
-        for t in range(max_time):
-            for v in x[i]:
-                r, c = v
-                neighbors = get_neighbors_mip(r, c, size, blocks)
-                neighbors.append(v)  # Can stay at same position
-                
+        for v in x[i]:
+            r, c = v
+            neighbors = get_neighbors_mip(r, c, size, neighbors_table)
+            neighbors.append(v)  # Can stay at same position
+            
+            for t in x[i][v]:
+                if t == 0:
+                    continue
                 # If at v at time t, must come from neighbor at t-1
-                prob += x[i][v][t + 1] <= lpSum([
-                    x[i][u][t] for u in neighbors if u in x[i]
+                prob += x[i][v][t] <= lpSum([
+                    x[i][u][t - 1] for u in neighbors if u in x[i] and t - 1 in x[i][u]
                 ])
         
         # Goal reached and stayed
         goal_v = (agent.goal.first, agent.goal.second)
-        if goal_v in x[i]:
-            for t in range(1, max_time + 1):
+        for t in x[i][goal_v]:
+            if t - 1 in x[i][goal_v]:
                 # Once at goal, stay there
                 prob += x[i][goal_v][t] >= x[i][goal_v][t - 1]
     
-    # Vertex collision constraints
-    for t in range(max_time + 1):
-        for r in range(size):
-            for c in range(size):
-                if not blocks[r][c]:
-                    v = (r, c)
-                    # At most one agent at position v at time t
-                    prob += lpSum([
-                        x[i][v][t] for i in range(len(agents)) if v in x[i]
-                    ]) <= 1
+    # Warm start from the prioritized-planning solution when it fits
+    warm_values = warm_start_values(agents, blocks, size, max_time, x)
+    
+    # Lazy vertex collision constraints: solve without them, then add a
+    # "at most one agent at v at time t" row only where the solution
+    # collides, and re-solve until it is collision-free (the MIP analogue
+    # of CBS). The optimum matches adding every row upfront.
+    collision_rows = set()
+    rounds = 0
     
-    # Solve with timeout
-    # Set a 30 second timeout to prevent hanging
-    prob.solve(PULP_CBC_CMD(msg=0, timeLimit=30))
+    while True:
+        rounds += 1
+        remaining = MIP_TIME_LIMIT - (time_module.time() - start_time_exec)
+        if remaining <= 0:
+            status = "Not Solved"
+            break
+        
+        for var, initial in warm_values.items():
+            var.setInitialValue(initial)
+        prob.solve(PULP_CBC_CMD(msg=0, timeLimit=remaining, warmStart=bool(warm_values)))
+        status = LpStatus[prob.status]
+        if status != 'Optimal':
+            break
+        
+        paths = extract_paths(agents, x, max_time)
+        new_rows = 0
+        for conflict in detect_conflicts(paths):
+            if conflict["type"] != "vertex":
+                continue
+            v = tuple(conflict["location"])
+            t = conflict["time"]
+            if (v, t) in collision_rows:
+                continue
+            collision_rows.add((v, t))
+            prob += lpSum([
+                x[i][v][t] for i in range(len(agents))
+                if v in x[i] and t in x[i][v]
+            ]) <= 1
+            new_rows += 1
+        
+        if new_rows == 0:
+            break
     
     solve_time = (time_module.time() - start_time_exec) * 1000
     
-    if LpStatus[prob.status] != 'Optimal':
+    if status != 'Optimal':
         return {
             "paths": None,
             "exploration_orders": [],
             "metrics": {
-                "explored_size": 0,
+                "explored_size": num_variables,
                 "time_taken_ms": solve_time,
                 "success": False,
                 "num_conflicts": 0,
                 "sum_of_costs": 0,
                 "makespan": 0,
-                "status": LpStatus[prob.status]
+                "status": status,
+                "mip_rounds": rounds
             },
             "conflicts": []
         }
     
-    # Extract paths
-    paths = []
+    # Trim paths once the agent reaches its goal for good
     max_makespan = 0
     total_cost = 0
     
-    for i, agent in enumerate(agents):
-        path = []
-        for t in range(max_time + 1):
-            for v in x[i]:
-                if value(x[i][v][t]) > 0.5:
-                    r, c = v
-                    path.append([r, c, t])
-                    break
+    for path, agent in zip(paths, agents):
+        goal_v = (agent.goal.first, agent.goal.second)
+        while len(path) > 1 and tuple(path[-2][:2]) == goal_v:
+            path.pop()
         
-        paths.append(path)
         if path:
             max_makespan = max(max_makespan, path[-1][2])
             total_cost += len(path) - 1
     
     metrics = {
-        "explored_size": len(agents) * size * size * max_time,  # MIP explores full space
+        "explored_size": num_variables,  # Variables left after pre-solve
         "time_taken_ms": solve_time,
         "success": True,
         "num_conflicts": 0,
         "sum_of_costs": total_cost,
         "makespan": max_makespan,
-        "optimal": True
+        "optimal": True,
+        "mip_rounds": rounds,
+        "collision_constraints": len(collision_rows)
     }
     
     return {
@@ -174,11 +253,69 @@ def mip_solver(
         "conflicts": []
     }
 
-def get_neighbors_mip(r: int, c: int, size: int, blocks: List[List[bool]]) -> List[Tuple[int, int]]:
-    """Get valid neighbors for MIP"""
-    neighbors = []
-    for dr, dc in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-        nr, nc = r + dr, c + dc
-        if 0 <= nr < size and 0 <= nc < size and not blocks[nr][nc]:
-            neighbors.append((nr, nc))
-    return neighbors
+def extract_paths(
+    agents: List[Agent],
+    x: Dict[int, Dict[Tuple[int, int], Dict[int, Any]]],
+    max_time: int
+) -> List[List[List[int]]]:
+    """Read full-horizon [r, c, t] paths out of a solved model"""
+    paths = []
+    for i in range(len(agents)):
+        path = []
+        for t in range(max_time + 1):
+            for v in x[i]:
+                if t in x[i][v] and value(x[i][v][t]) > 0.5:
+                    r, c = v
+                    path.append([r, c, t])
+                    break
+        paths.append(path)
+    return paths
+
+def warm_start_values(
+    agents: List[Agent],
+    blocks: np.ndarray,
+    size: int,
+    max_time: int,
+    x: Dict[int, Dict[Tuple[int, int], Dict[int, Any]]]
+) -> Dict[Any, int]:
+    """
+    Initial MIP variable values from Cooperative A*'s solution
+    
+    Paths are extended by waiting at the goal up to max_time. CBC discards
+    the start if it turns out infeasible, so this can only help.
+    
+    Returns:
+        variable -> 0/1, empty if Cooperative A* found no solution
+    """
+    result = cooperative_astar(
+        agents, blocks, size, max_time,
+        priority_policy="id_order", track_exploration=False
+    )
+    if result["paths"] is None:
+        return {}
+    
+    # id_order returns paths sorted by agent id
+    by_id = {
+        agent.id: path
+        for agent, path in zip(sorted(agents, key=lambda a: a.id), result["paths"])
+    }
+    
+    values = {}
+    for i, agent in enumerate(agents):
+        path = by_id[agent.id]
+        cells = {t: (r, c) for r, c, t in path}
+        goal_v = (agent.goal.first, agent.goal.second)
+        for v in x[i]:
+            for t, var in x[i][v].items():
+                values[var] = 1 if cells.get(t, goal_v) == v else 0
+    
+    return values
+
+def get_neighbors_mip(
+    r: int,
+    c: int,
+    size: int,
+    neighbors_table: List[Tuple[int, ...]]
+) -> List[Tuple[int, int]]:
+    """Get valid neighbors for MIP from the per-cell move table"""
+    return [decode_cell(key, size) for key in neighbors_table[encode_cell(r, c, size)]]
@@ -2,157 +2,498 @@
 Space-Time A* Algorithm
 State: (x, y, t) - position and time
 Actions: move(N,E,S,W) or wait
-Heuristic: Manhattan distance (admissible)
+Heuristic: Manhattan distance (admissible), or a precomputed true-distance
+table from build_true_distance_heuristic
 """
 import time
-from typing import Dict, Any, List, Set, Tuple, Optional
-from queue import PriorityQueue
-from dataclasses import dataclass
-import itertools
+from typing import Dict, Any, List, Set, Tuple, Optional, Union, Iterable
+import heapq
+from array import array
+from collections import deque
+import numpy as np
 import sys
 sys.path.append('..')
-from utils import Pair, Agent, get_neighbors, manhattan_distance
+from utils import Pair, Agent, in_bounds, as_grid, encode_cell, decode_cell, build_neighbors_table, DX_4D, DY_4D
+import utils_numba
 
-@dataclass
-class SpaceTimeState:
-    pos: Pair
-    time: int
-    
-    def __eq__(self, other):
-        return self.pos == other.pos and self.time == other.time
-    
-    def __hash__(self):
-        return hash((self.pos, self.time))
-    
-    def __lt__(self, other):
-        if self.time != other.time:
-            return self.time < other.time
-        return (self.pos.first, self.pos.second) < (other.pos.first, other.pos.second)
+try:
+    from numba import njit, types
+    from numba.typed import Dict as TypedDict
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+INF = float('inf')
+# Heuristic value for cells that cannot reach the goal at all
+HEURISTIC_INF = np.iinfo(np.int16).max
 
 def space_time_astar(
     agent: Agent,
     blocks: List[List[bool]],
     size: int,
     max_time: int = 100,
-    constraints: Optional[Set[Tuple[int, int, int]]] = None,
-    reservation_table: Optional[Set[Tuple[int, int, int]]] = None
+    constraints: Optional[Union[Set[int], np.ndarray]] = None,
+    reservations: Optional[List[Set[int]]] = None,
+    goal_from_time: Optional[Dict[int, int]] = None,
+    cost_upper_bound: Optional[int] = None,
+    h_table: Optional[np.ndarray] = None,
+    neighbors_table: Optional[List[Tuple[int, ...]]] = None,
+    track_exploration: bool = False
 ) -> Dict[str, Any]:
     """
     Space-Time A* for single agent
     
+    Uses the Numba-compiled search kernel when numba is installed and
+    falls back to the pure-Python search otherwise.
+    
     Args:
         agent: Agent with start and goal
-        blocks: 2D grid of obstacles
+        blocks: 2D grid of obstacles (nested lists or array; converted
+            with as_grid)
         size: Grid size
         max_time: Maximum time horizon
-        constraints: Set of (x, y, t) forbidden states
-        reservation_table: Set of (x, y, t) reserved by other agents
+        constraints: Forbidden states encoded with encode_state, either as
+            a set or pre-encoded as a sorted int64 array (see sorted_keys)
+        reservations: Per-cell sets of timestamps reserved by other agents,
+            indexed by cell key (see utils.encode_cell)
+        goal_from_time: cell key -> first timestep from which the cell is
+            reserved for good (another agent parked at its goal)
+        cost_upper_bound: Skip states with f >= this bound (paths that cost
+            at least this much are useless to the caller)
+        h_table: Optional (size, size) heuristic table for this agent's goal,
+            e.g. from build_true_distance_heuristic; Manhattan if omitted
+        neighbors_table: Optional per-cell move table from
+            build_neighbors_table, shared across searches on the same grid;
+            built here if omitted (pure-Python search only)
+        track_exploration: Record every generated state in
+            exploration_order for visualization; left empty otherwise
     
     Returns:
-        Dictionary with path, exploration_order, and metrics
+        Dictionary with path, exploration_order (a (k, 3) int32 array of
+        [x, y, t] rows), and metrics
     """
     start_time = time.time()
+    blocks = as_grid(blocks)
     
     if constraints is None:
         constraints = set()
-    if reservation_table is None:
-        reservation_table = set()
-    
-    # Priority queue: (f_cost, counter, g_cost, state)
-    pq = PriorityQueue()
-    counter = itertools.count()
-    start_state = SpaceTimeState(agent.start, 0)
-    h_start = manhattan_distance(agent.start, agent.goal)
-    pq.put((h_start, next(counter), 0, start_state))
-    
-    # Tracking
-    visited: Set[SpaceTimeState] = set()
-    parent: Dict[SpaceTimeState, Optional[SpaceTimeState]] = {start_state: None}
-    g_cost: Dict[SpaceTimeState, int] = {start_state: 0}
-    exploration_order = [[agent.start.first, agent.start.second, 0]]
+    if goal_from_time is None:
+        goal_from_time = {}
+    
+    # States with f > max_time cannot reach the goal within the horizon
+    f_limit = max_time + 1
+    if cost_upper_bound is not None:
+        f_limit = min(f_limit, cost_upper_bound)
+    
+    on_grid = (in_bounds(agent.start.first, agent.start.second, size)
+               and in_bounds(agent.goal.first, agent.goal.second, size))
+    # Only built for on-grid goals: far-off coordinates overflow the int16 table
+    if on_grid and h_table is None:
+        h_table = build_manhattan_heuristic(agent.goal, size)
+    
+    if not on_grid:
+        # Off-grid endpoints have no path; both searches index the grid unchecked
+        path = None
+        exploration_order = np.empty((0, 3), dtype=np.int32)
+        nodes_expanded = explored_size = 0
+    elif NUMBA_AVAILABLE:
+        if not isinstance(constraints, np.ndarray):
+            constraints = sorted_keys(constraints)
+        found, path_arr, explored_arr, nodes_expanded = _astar_numba(
+            blocks,
+            agent.start.first, agent.start.second,
+            agent.goal.first, agent.goal.second,
+            size, max_time, f_limit,
+            constraints,
+            encode_reservations(reservations, size),
+            encode_goal_from_time(goal_from_time, size, max_time),
+            h_table, track_exploration
+        )
+        path = path_arr.tolist() if found else None
+        exploration_order = explored_arr.astype(np.int32)
+        explored_size = nodes_expanded
+    else:
+        if isinstance(constraints, np.ndarray):
+            constraints = set(constraints.tolist())
+        if neighbors_table is None:
+            neighbors_table = build_neighbors_table(blocks, size)
+        path, exploration_order, nodes_expanded, explored_size = _search_python(
+            agent, neighbors_table, size, max_time, f_limit, constraints, reservations, goal_from_time,
+            h_table.ravel().tolist(), track_exploration
+        )
+    
+    if path is None:
+        metrics = {
+            "explored_size": explored_size,
+            "nodes_expanded": nodes_expanded,
+            "time_taken_ms": (time.time() - start_time) * 1000,
+            "path_length": 0,
+            "makespan": 0,
+            "success": False
+        }
+    else:
+        metrics = {
+            "explored_size": explored_size,
+            "nodes_expanded": nodes_expanded,
+            "time_taken_ms": (time.time() - start_time) * 1000,
+            "path_length": len(path) - 1,
+            "makespan": path[-1][2],
+            "success": True
+        }
+    
+    return {
+        "path": path,
+        "exploration_order": exploration_order,
+        "metrics": metrics
+    }
+
+def encode_state(x: int, y: int, t: int, size: int) -> int:
+    """Pack a space-time state (x, y, t) into a single int key"""
+    return (t * size + x) * size + y
+
+def decode_state(key: int, size: int) -> Tuple[int, int, int]:
+    """Inverse of encode_state"""
+    t, rem = divmod(key, size * size)
+    x, y = divmod(rem, size)
+    return x, y, t
+
+def sorted_keys(keys: Iterable[int]) -> np.ndarray:
+    """
+    Sorted int64 array of encoded states, for binary-search membership tests
+    
+    This is the form the Numba kernel consumes; callers that reuse a
+    constraint set across searches can encode it once and pass the array.
+    """
+    arr = np.fromiter(keys, dtype=np.int64)
+    arr.sort()
+    return arr
+
+def encode_reservations(reservations: Optional[List[Set[int]]], size: int) -> np.ndarray:
+    """Flatten per-cell reserved timestamps into a sorted array of state keys"""
+    if reservations is None:
+        return np.empty(0, dtype=np.int64)
+    cells = size * size
+    return sorted_keys({
+        t * cells + cell
+        for cell in range(cells)
+        for t in reservations[cell]
+    })
+
+def encode_goal_from_time(goal_from_time: Dict[int, int], size: int, max_time: int) -> np.ndarray:
+    """Dense per-cell array of goal_from_time; max_time + 1 means never reserved"""
+    arr = np.full(size * size, max_time + 1, dtype=np.int64)
+    for cell, t in goal_from_time.items():
+        arr[cell] = t
+    return arr
+
+def build_manhattan_heuristic(goal: Pair, size: int) -> np.ndarray:
+    """
+    Manhattan distance to goal for every cell, computed once per search
+    
+    Returns:
+        (size, size) int16 array of distances
+    """
+    coords = np.arange(size, dtype=np.int16)
+    return np.abs(coords - goal.first)[:, None] + np.abs(coords - goal.second)[None, :]
+
+def build_true_distance_heuristic(
+    goal: Pair,
+    blocks: List[List[bool]],
+    size: int,
+    neighbors_table: Optional[List[Tuple[int, ...]]] = None
+) -> np.ndarray:
+    """
+    Exact obstacle-aware distance to goal via backward BFS over the static grid
+    
+    Waiting only adds cost, so this is admissible for space-time A* and never
+    weaker than Manhattan. Unreachable cells (all of them if the goal is
+    off the grid) get HEURISTIC_INF.
+    
+    The whole BFS runs compiled when numba is installed; otherwise it walks
+    neighbors_table (built here if omitted).
+    
+    Returns:
+        (size, size) int16 array of distances
+    """
+    blocks = as_grid(blocks)
+    if not in_bounds(goal.first, goal.second, size):
+        return np.full((size, size), HEURISTIC_INF, dtype=np.int16)
+    if NUMBA_AVAILABLE:
+        return utils_numba.bfs_distances(goal.first, goal.second, blocks, HEURISTIC_INF)
+    
+    if neighbors_table is None:
+        neighbors_table = build_neighbors_table(blocks, size)
+    goal_cell = encode_cell(goal.first, goal.second, size)
+    dist = [HEURISTIC_INF] * (size * size)
+    dist[goal_cell] = 0
+    queue = deque([goal_cell])
+    
+    while queue:
+        cell = queue.popleft()
+        d = dist[cell] + 1
+        for next_cell in neighbors_table[cell]:
+            if dist[next_cell] == HEURISTIC_INF:
+                dist[next_cell] = d
+                queue.append(next_cell)
+    
+    return np.array(dist, dtype=np.int16).reshape(size, size)
+
+def _search_python(
+    agent: Agent,
+    neighbors_table: List[Tuple[int, ...]],
+    size: int,
+    max_time: int,
+    f_limit: int,
+    constraints: Set[int],
+    reservations: Optional[List[Set[int]]],
+    goal_from_time: Dict[int, int],
+    h_flat: List[int],
+    track_exploration: bool
+) -> Tuple[Optional[List[List[int]]], np.ndarray, int, int]:
+    """
+    Pure-Python space-time A* search
+    
+    Returns:
+        (path or None, exploration_order, nodes_expanded, explored_size)
+    """
+    sx, sy = agent.start.first, agent.start.second
+    cells = size * size
+    goal_cell = encode_cell(agent.goal.first, agent.goal.second, size)
+    
+    # Priority queue: (f_cost, -g_cost, state_key); ties on f prefer deeper nodes
+    pq = []
+    start_key = encode_state(sx, sy, 0, size)
+    heapq.heappush(pq, (h_flat[encode_cell(sx, sy, size)], 0, start_key))
+    
+    # Parent of every generated state, keyed by encoded state; membership
+    # doubles as the seen set. g == t for unit-cost moves/waits, so a state
+    # is pushed at most once, every pop is a fresh expansion, and no
+    # closed set or g-cost table is needed.
+    parent: Dict[int, Optional[int]] = {start_key: None}
+    # Flat int32 x, y, t triples; 4 bytes per value instead of an int object.
+    # int32 rather than int16 because t runs up to the unbounded max_time.
+    exploration_order = array('i', (sx, sy, 0) if track_exploration else ())
     nodes_expanded = 0
     
-    while not pq.empty():
-        _, _, g, current = pq.get()
-        
-        if current in visited:
-            continue
-        
-        visited.add(current)
+    while pq:
+        current = heapq.heappop(pq)[2]
         nodes_expanded += 1
+        t, cell = divmod(current, cells)
         
         # Goal check
-        if current.pos == agent.goal:
+        if cell == goal_cell:
             # Reconstruct path
             path = []
-            state = current
-            while state is not None:
-                path.insert(0, [state.pos.first, state.pos.second, state.time])
-                state = parent[state]
-            
-            metrics = {
-                "explored_size": len(visited),
-                "nodes_expanded": nodes_expanded,
-                "time_taken_ms": (time.time() - start_time) * 1000,
-                "path_length": len(path) - 1,
-                "makespan": current.time,
-                "success": True
-            }
+            key = current
+            while key is not None:
+                path.append(list(decode_state(key, size)))
+                key = parent[key]
+            path.reverse()
             
-            return {
-                "path": path,
-                "exploration_order": exploration_order,
-                "metrics": metrics
-            }
+            return path, _exploration_rows(exploration_order), nodes_expanded, nodes_expanded
         
         # Time limit check
-        if current.time >= max_time:
+        if t >= max_time:
             continue
         
         # Generate successors: move or wait
-        successors = []
-        
-        # Move actions
-        for neighbor in get_neighbors(current.pos, blocks, size):
-            next_state = SpaceTimeState(neighbor, current.time + 1)
-            successors.append(next_state)
-        
-        # Wait action
-        wait_state = SpaceTimeState(current.pos, current.time + 1)
-        successors.append(wait_state)
-        
-        for next_state in successors:
+        nt = t + 1
+        for next_cell in neighbors_table[cell] + (cell,):
+            next_key = nt * cells + next_cell
+            
             # Check constraints and reservations
-            pos_tuple = (next_state.pos.first, next_state.pos.second, next_state.time)
-            if pos_tuple in constraints or pos_tuple in reservation_table:
+            if next_key in constraints:
+                continue
+            if reservations is not None and nt in reservations[next_cell]:
+                continue
+            if nt >= goal_from_time.get(next_cell, INF):
                 continue
             
-            if next_state in visited:
+            if next_key in parent:
                 continue
             
-            new_g = g + 1
+            f = nt + h_flat[next_cell]
+            if f >= f_limit:
+                continue
             
-            if next_state not in g_cost or new_g < g_cost[next_state]:
-                g_cost[next_state] = new_g
-                h = manhattan_distance(next_state.pos, agent.goal)
-                f = new_g + h
-                
-                pq.put((f, next(counter), new_g, next_state))
-                parent[next_state] = current
-                exploration_order.append([next_state.pos.first, next_state.pos.second, next_state.time])
+            heapq.heappush(pq, (f, -nt, next_key))
+            parent[next_key] = current
+            if track_exploration:
+                exploration_order.extend((*decode_cell(next_cell, size), nt))
     
     # No path found
-    metrics = {
-        "explored_size": len(visited),
-        "nodes_expanded": nodes_expanded,
-        "time_taken_ms": (time.time() - start_time) * 1000,
-        "path_length": 0,
-        "makespan": 0,
-        "success": False
-    }
+    return None, _exploration_rows(exploration_order), nodes_expanded, nodes_expanded
+
+def _exploration_rows(flat: array) -> np.ndarray:
+    """View flat int32 x, y, t triples as a (k, 3) array"""
+    return np.frombuffer(flat, dtype=np.int32).reshape(-1, 3)
+
+if NUMBA_AVAILABLE:
+    _DX = np.array(DX_4D, dtype=np.int64)
+    _DY = np.array(DY_4D, dtype=np.int64)
     
-    return {
-        "path": None,
-        "exploration_order": exploration_order,
-        "metrics": metrics
-    }
+    @njit(cache=True)
+    def _contains(sorted_keys, key):
+        idx = np.searchsorted(sorted_keys, key)
+        return idx < sorted_keys.shape[0] and sorted_keys[idx] == key
+    
+    @njit(cache=True)
+    def _row_less(heap, i, f, neg_g, key):
+        """Lexicographic heap[i] < (f, neg_g, key), matching Python tuple order"""
+        if heap[i, 0] != f:
+            return heap[i, 0] < f
+        if heap[i, 1] != neg_g:
+            return heap[i, 1] < neg_g
+        return heap[i, 2] < key
+    
+    @njit(cache=True)
+    def _heap_push(heap, n, f, neg_g, key):
+        """Push (f, -g, key) onto an array-backed binary heap of n entries"""
+        if n == heap.shape[0]:
+            grown = np.empty((2 * n, 3), dtype=np.int64)
+            grown[:n] = heap
+            heap = grown
+        i = n
+        while i > 0:
+            p = (i - 1) >> 1
+            if _row_less(heap, p, f, neg_g, key):
+                break
+            heap[i, 0] = heap[p, 0]
+            heap[i, 1] = heap[p, 1]
+            heap[i, 2] = heap[p, 2]
+            i = p
+        heap[i, 0] = f
+        heap[i, 1] = neg_g
+        heap[i, 2] = key
+        return heap
+    
+    @njit(cache=True)
+    def _heap_pop(heap, n):
+        """Pop the smallest key from a heap of n entries (caller decrements n)"""
+        key = heap[0, 2]
+        n -= 1
+        f = heap[n, 0]
+        neg_g = heap[n, 1]
+        last = heap[n, 2]
+        i = 0
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and _row_less(heap, child + 1, heap[child, 0], heap[child, 1], heap[child, 2]):
+                child += 1
+            if not _row_less(heap, child, f, neg_g, last):
+                break
+            heap[i, 0] = heap[child, 0]
+            heap[i, 1] = heap[child, 1]
+            heap[i, 2] = heap[child, 2]
+            i = child
+        heap[i, 0] = f
+        heap[i, 1] = neg_g
+        heap[i, 2] = last
+        return key
+    
+    @njit(cache=True, nogil=True)
+    def _astar_numba(blocks_np, sx, sy, gx, gy, size, max_time, f_limit, constraints_arr, reservations_arr, goal_from_arr, h_table, track_exploration):
+        """
+        Space-time A* kernel over integer state keys (see encode_state)
+        
+        Mirrors _search_python exactly (same successor order and
+        (f, -g, key) heap ordering), so both paths return identical results.
+        Releases the GIL, so searches for different agents can run on threads.
+        
+        Returns:
+            (found, path (L, 3), exploration_order (k, 3), nodes_expanded)
+        """
+        cells = size * size
+        usize = np.uint32(size)
+        # Parent of every generated state (the start maps to -1). Sized by
+        # the states this search touches, not by the (max_time + 1) * cells
+        # space-time volume; membership doubles as the seen set.
+        parent = TypedDict.empty(key_type=types.int64, value_type=types.int64)
+        
+        heap = np.empty((64, 3), dtype=np.int64)
+        explored = np.empty((64 if track_exploration else 0, 3), dtype=np.int64)
+        
+        start_key = sx * size + sy
+        parent[start_key] = -1
+        heap = _heap_push(heap, 0, np.int64(h_table[sx, sy]), 0, start_key)
+        n_heap = 1
+        n_explored = 0
+        if track_exploration:
+            explored[0, 0] = sx
+            explored[0, 1] = sy
+            explored[0, 2] = 0
+            n_explored = 1
+        nodes_expanded = 0
+        
+        while n_heap > 0:
+            key = _heap_pop(heap, n_heap)
+            n_heap -= 1
+            # Every state is pushed at most once (see below), so each pop
+            # is a fresh expansion and needs no closed-set check
+            nodes_expanded += 1
+            
+            t = key // cells
+            x = (key % cells) // size
+            y = key % size
+            
+            if x == gx and y == gy:
+                path = np.empty((t + 1, 3), dtype=np.int64)
+                k = key
+                for i in range(t, -1, -1):
+                    path[i, 0] = (k % cells) // size
+                    path[i, 1] = k % size
+                    path[i, 2] = i
+                    k = parent[k]
+                return True, path, explored[:n_explored], nodes_expanded
+            
+            if t >= max_time:
+                continue
+            
+            nt = t + 1
+            for d in range(5):
+                if d < 4:
+                    nx = x + _DX[d]
+                    ny = y + _DY[d]
+                    # Unsigned compare: negatives wrap past size
+                    if np.uint32(nx) >= usize or np.uint32(ny) >= usize or blocks_np[nx, ny]:
+                        continue
+                else:
+                    nx = x
+                    ny = y
+                
+                next_key = (nt * size + nx) * size + ny
+                if _contains(constraints_arr, next_key) or _contains(reservations_arr, next_key):
+                    continue
+                if nt >= goal_from_arr[nx * size + ny]:
+                    continue
+                if next_key in parent:
+                    continue
+                f = nt + np.int64(h_table[nx, ny])
+                if f >= f_limit:
+                    continue
+                
+                # g == t for unit-cost moves/waits, so a state is pushed at most once
+                parent[next_key] = key
+                heap = _heap_push(heap, n_heap, f, -nt, next_key)
+                n_heap += 1
+                
+                if track_exploration:
+                    if n_explored == explored.shape[0]:
+                        grown = np.empty((2 * n_explored, 3), dtype=np.int64)
+                        grown[:n_explored] = explored
+                        explored = grown
+                    explored[n_explored, 0] = nx
+                    explored[n_explored, 1] = ny
+                    explored[n_explored, 2] = nt
+                    n_explored += 1
+        
+        return False, np.empty((0, 3), dtype=np.int64), explored[:n_explored], nodes_expanded
+    
+    # Compile (or load from cache) at import so the first request doesn't pay for it
+    _astar_numba(
+        np.zeros((1, 1), dtype=np.uint8), 0, 0, 0, 0, 1, 0, 1,
+        np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.ones(1, dtype=np.int64),
+        np.zeros((1, 1), dtype=np.int16), False
+    )
@@ -2,7 +2,7 @@
 Multi-Agent Pathfinding Solver
 Main entry point for all MAPF algorithms
 """
-from utils import Pair, Agent
+from utils import Pair, Agent, in_bounds, as_grid, pack_grid, unpack_grid
 from algorithms import (
     space_time_astar,
     independent_astar,
@@ -14,6 +14,10 @@ from algorithms import (
 __all__ = [
     'Pair',
     'Agent',
+    'in_bounds',
+    'as_grid',
+    'pack_grid',
+    'unpack_grid',
     'space_time_astar',
     'independent_astar',
     'cooperative_astar',
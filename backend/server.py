@@ -1,23 +1,47 @@
 """
 FastAPI Server for MAPF Backend
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, field_validator, model_validator
 from typing import List, Optional
-import random
+from functools import partial
+import logging
+import os
+import sys
+import numpy as np
 from mapf_solver import (
-    Pair, Agent,
+    Pair, Agent, in_bounds, as_grid, unpack_grid,
     independent_astar, cooperative_astar, cbs, mip_solver
 )
 
-app = FastAPI()
+log = logging.getLogger("mapf")
 
-# Enable CORS
+# orjson serializes the large nested path/exploration lists (and numpy
+# values) in C instead of the stdlib json encoder
+app = FastAPI(default_response_class=ORJSONResponse)
+
+def cors_origins(frontend_origin: Optional[str]) -> dict:
+    """
+    CORSMiddleware origin settings for a FRONTEND_ORIGIN value
+    
+    A set value is a comma-separated allow-list and nothing else is
+    accepted. Unset (local development) allows the Vite dev server on any
+    localhost port, since Vite moves to 5174, 5175, ... when 5173 is taken.
+    """
+    if frontend_origin:
+        origins = [origin.strip() for origin in frontend_origin.split(",") if origin.strip()]
+        return {"allow_origins": origins, "allow_origin_regex": None}
+    return {"allow_origins": ["http://localhost:5173"], "allow_origin_regex": r"http://localhost:\d+"}
+
+# Enable CORS for the frontend only. The API uses no cookies, so
+# credentials stay off.
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
+    **cors_origins(os.environ.get("FRONTEND_ORIGIN")),
+    allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
 )
@@ -32,14 +56,33 @@ class GenerateScenarioRequest(BaseModel):
 class GenerateScenarioResponse(BaseModel):
     blocks: List[List[bool]]
     agents: List[dict]  # {id, start: [x,y], goal: [x,y]}
+    
+    @field_validator("blocks", mode="before")
+    @classmethod
+    def blocks_from_array(cls, value):
+        """Accept the generator's numpy grid; converted to lists only here"""
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        return value
 
 class RunAlgorithmRequest(BaseModel):
-    blocks: List[List[bool]]
+    # Grid bit-packed row-major, 8 cells per byte, base64 (see utils.pack_grid);
+    # decoded in one call instead of validating every cell
+    blocks_b64: Optional[str] = None
+    blocks: Optional[List[List[bool]]] = Field(
+        default=None, description="Deprecated: send blocks_b64 instead"
+    )
     agents: List[dict]
     size: int
     algorithm: str
     max_time: Optional[int] = 100
     priority_policy: Optional[str] = "distance_first"
+    
+    @model_validator(mode="after")
+    def require_grid(self):
+        if self.blocks_b64 is None and self.blocks is None:
+            raise ValueError("either blocks_b64 or blocks is required")
+        return self
 
 class RunAlgorithmResponse(BaseModel):
     paths: Optional[List[List[List[int]]]]
@@ -54,32 +97,19 @@ async def root():
 @app.post("/api/generate-scenario", response_model=GenerateScenarioResponse)
 async def generate_scenario(request: GenerateScenarioRequest):
     """Generate random MAPF scenario"""
-    if request.seed is not None:
-        random.seed(request.seed)
+    rng = np.random.default_rng(request.seed)
     
     size = request.size
     num_agents = request.num_agents
     obstacle_pct = request.obstacle_percentage
     
-    # Generate obstacles
-    blocks = [[False for _ in range(size)] for _ in range(size)]
+    # Generate obstacles: sample distinct cells in one call
     num_obstacles = int(size * size * obstacle_pct)
+    blocks = np.zeros((size, size), dtype=bool)
+    blocks.flat[rng.choice(size * size, num_obstacles, replace=False)] = True
     
-    obstacle_positions = set()
-    while len(obstacle_positions) < num_obstacles:
-        r = random.randint(0, size - 1)
-        c = random.randint(0, size - 1)
-        obstacle_positions.add((r, c))
-    
-    for r, c in obstacle_positions:
-        blocks[r][c] = True
-    
-    # Generate agent start/goal positions
-    free_cells = []
-    for r in range(size):
-        for c in range(size):
-            if not blocks[r][c]:
-                free_cells.append((r, c))
+    # Generate agent start/goal positions from the (M, 2) free cells, row-major
+    free_cells = np.argwhere(~blocks)
     
     if len(free_cells) < num_agents * 2:
         # Not enough space
@@ -88,12 +118,12 @@ async def generate_scenario(request: GenerateScenarioRequest):
             agents=[]
         )
     
-    random.shuffle(free_cells)
+    picked = free_cells[rng.permutation(len(free_cells))[:num_agents * 2]].tolist()
     agents = []
     
     for i in range(num_agents):
-        start_r, start_c = free_cells[i * 2]
-        goal_r, goal_c = free_cells[i * 2 + 1]
+        start_r, start_c = picked[i * 2]
+        goal_r, goal_c = picked[i * 2 + 1]
         
         agents.append({
             "id": i,
@@ -119,51 +149,79 @@ async def run_algorithm(request: RunAlgorithmRequest):
         for a in request.agents
     ]
     
-    blocks = request.blocks
+    # Convert the grid once; every solver indexes the same uint8 array
     size = request.size
+    for agent in agents:
+        if not (in_bounds(*agent.start, size) and in_bounds(*agent.goal, size)):
+            raise HTTPException(
+                status_code=422,
+                detail=f"Agent {agent.id} start/goal is outside the {size}x{size} grid"
+            )
+    if request.blocks_b64 is not None:
+        try:
+            blocks = unpack_grid(request.blocks_b64, size)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid blocks_b64: {e}")
+    else:
+        blocks = as_grid(request.blocks)
     max_time = request.max_time
     
-    print(f"\n=== Running {request.algorithm} ===")
-    print(f"Agents: {len(agents)}, Size: {size}, Max time: {max_time}")
-    for agent in agents:
-        print(f"  Agent {agent.id}: ({agent.start.first},{agent.start.second}) -> ({agent.goal.first},{agent.goal.second})")
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Running %s: %d agents, size %d, max time %d", request.algorithm, len(agents), size, max_time)
+        for agent in agents:
+            log.debug("  Agent %d: (%d,%d) -> (%d,%d)", agent.id,
+                      agent.start.first, agent.start.second, agent.goal.first, agent.goal.second)
     
-    # Run selected algorithm
+    # Select algorithm
     if request.algorithm == "independent":
-        result = independent_astar(agents, blocks, size, max_time)
+        solve = partial(independent_astar, agents, blocks, size, max_time)
     elif request.algorithm == "cooperative":
-        result = cooperative_astar(
-            agents, blocks, size, max_time,
+        solve = partial(
+            cooperative_astar, agents, blocks, size, max_time,
             priority_policy=request.priority_policy
         )
     elif request.algorithm == "cbs":
-        result = cbs(agents, blocks, size, max_time)
+        solve = partial(cbs, agents, blocks, size, max_time)
     elif request.algorithm == "mip":
         # MIP needs much smaller time horizons to be tractable
         # Estimate: 2 * grid_size is usually enough for optimal path
         mip_time_limit = min(max_time, size * 3, 30)
-        print(f"  MIP time limit: {mip_time_limit} (reduced from {max_time})")
-        result = mip_solver(agents, blocks, size, mip_time_limit)
+        log.debug("MIP time limit: %d (reduced from %d)", mip_time_limit, max_time)
+        solve = partial(mip_solver, agents, blocks, size, mip_time_limit)
     else:
-        return RunAlgorithmResponse(
-            paths=None,
-            exploration_orders=[],
-            metrics={"error": f"Unknown algorithm: {request.algorithm}"},
-            conflicts=[]
-        )
+        return ORJSONResponse({
+            "paths": None,
+            "exploration_orders": [],
+            "metrics": {"error": f"Unknown algorithm: {request.algorithm}"},
+            "conflicts": []
+        })
     
-    print(f"Result: paths={'Found' if result.get('paths') else 'None'}, success={result.get('metrics', {}).get('success')}")
-    if result.get("paths"):
-        print(f"  Paths length: {len(result['paths'])}")
-    print(f"=== Done ===\n")
+    # Solvers can run for seconds; keep the event loop free for other requests
+    result = await run_in_threadpool(solve)
     
-    return RunAlgorithmResponse(
-        paths=result.get("paths"),
-        exploration_orders=result.get("exploration_orders", []),
-        metrics=result.get("metrics", {}),
-        conflicts=result.get("conflicts", [])
-    )
+    log.debug("Result: paths=%s, success=%s",
+              "Found" if result.get("paths") else "None", result.get("metrics", {}).get("success"))
+    
+    # Returned directly so the payload skips response-model validation;
+    # RunAlgorithmResponse still documents the schema
+    return ORJSONResponse({
+        "paths": result.get("paths"),
+        "exploration_orders": result.get("exploration_orders", []),
+        "metrics": result.get("metrics", {}),
+        "conflicts": result.get("conflicts", [])
+    })
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # C event loop and HTTP parser (uvloop has no Windows build). Solvers
+    # hold the GIL in pure-Python parts, so scale with worker processes;
+    # multiple workers need the app as an import string.
+    uvicorn.run(
+        "server:app",
+        host="0.0.0.0",
+        port=8000,
+        log_level="info",
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        workers=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+    )
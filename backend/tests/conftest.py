@@ -5,6 +5,28 @@ Test configuration and fixtures for pytest.
 import pytest
 import sys
 import os
+import numpy as np
 
 # Add backend directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.testclient import TestClient
+from server import app
+
+
+@pytest.fixture(scope="session")
+def client():
+    """One TestClient shared by every API test"""
+    return TestClient(app)
+
+
+@pytest.fixture(scope="session")
+def empty_grid_3():
+    """3x3 obstacle-free grid (shared; do not mutate)"""
+    return np.zeros((3, 3), dtype=bool).tolist()
+
+
+@pytest.fixture(scope="session")
+def empty_grid_5():
+    """5x5 obstacle-free grid (shared; do not mutate)"""
+    return np.zeros((5, 5), dtype=bool).tolist()
@@ -3,22 +3,31 @@ Unit tests for MAPF algorithms.
 Tests each algorithm's correctness, edge cases, and performance.
 """
 
+import importlib
+from functools import lru_cache
 import pytest
-from algorithms.independent_astar import independent_astar
+import numpy as np
+from algorithms.independent_astar import independent_astar, detect_conflicts, detect_first_conflict, summarize_conflicts
 from algorithms.cooperative_astar import cooperative_astar
 from algorithms.cbs import cbs
 from algorithms.mip_solver import mip_solver
 from utils import Pair, Agent
 
+# The package re-exports the functions under their modules' names
+st_module = importlib.import_module("algorithms.space_time_astar")
+ia_module = importlib.import_module("algorithms.independent_astar")
+
+
+@lru_cache(maxsize=None)
+def _agent(agent_id, sr, sc, gr, gc):
+    """Agent factory; Agent is frozen, so cached instances can be shared"""
+    return Agent(id=agent_id, start=Pair(sr, sc), goal=Pair(gr, gc))
+
 
 def convert_agents(agent_dicts):
     """Convert agent dicts to Agent objects"""
     return [
-        Agent(
-            id=a["id"],
-            start=Pair(a["start"][0], a["start"][1]),
-            goal=Pair(a["goal"][0], a["goal"][1])
-        )
+        _agent(a["id"], a["start"][0], a["start"][1], a["goal"][0], a["goal"][1])
         for a in agent_dicts
     ]
 
@@ -94,6 +103,21 @@ class TestAlgorithms:
         # Agents moving towards each other should have conflicts
         assert result["metrics"]["num_conflicts"] > 0
     
+    def test_first_conflict_matches_full_detection(self):
+        """Test: detect_first_conflict returns the first of detect_conflicts"""
+        paths = [
+            [[0, 0, 0], [0, 1, 1], [0, 2, 2]],
+            [[0, 2, 0], [0, 1, 1], [0, 0, 2]],
+            [[1, 0, 0], [1, 1, 1]]
+        ]
+        
+        conflicts = detect_conflicts(paths)
+        assert len(conflicts) > 0
+        assert detect_first_conflict(paths) == conflicts[0]
+        assert detect_first_conflict([paths[0], paths[2]]) is None
+        assert summarize_conflicts(paths) == (len(conflicts), conflicts[0])
+        assert summarize_conflicts([paths[0], paths[2]]) == (0, None)
+    
     def test_cooperative_avoids_conflicts(self):
         """Test: Cooperative A* should avoid conflicts"""
         agent_dicts = [
@@ -140,6 +164,24 @@ class TestAlgorithms:
         assert "metrics" in result
         assert "success" in result["metrics"]
     
+    def test_mip_paths_reach_goals(self):
+        """Test: MIP paths start at the start, end at the goal, and are optimal"""
+        agent_dicts = [
+            {"id": 0, "start": [0, 0], "goal": [2, 2]},
+            {"id": 1, "start": [2, 0], "goal": [0, 2]}
+        ]
+        agents = convert_agents(agent_dicts)
+        blocks = [[False] * 3 for _ in range(3)]
+        size = 3
+        
+        result = mip_solver(agents, blocks, size, max_time=8)
+        assert result["metrics"]["success"] == True
+        for agent, path in zip(agents, result["paths"]):
+            assert path[0][:2] == [agent.start.first, agent.start.second]
+            assert path[-1][:2] == [agent.goal.first, agent.goal.second]
+        # Both agents can take a shortest route without meeting
+        assert result["metrics"]["sum_of_costs"] == 8
+    
     def test_cbs_small_scenario(self):
         """Test: CBS on small scenario"""
         agent_dicts = [
@@ -155,6 +197,43 @@ class TestAlgorithms:
         if result["metrics"]["success"]:
             assert result["metrics"]["num_conflicts"] == 0
     
+    def test_cbs_cost_upper_bound(self):
+        """Test: CBS prunes everything at or above a known cost bound"""
+        agent_dicts = [
+            {"id": 0, "start": [0, 0], "goal": [0, 2]},
+            {"id": 1, "start": [0, 2], "goal": [0, 0]}
+        ]
+        agents = convert_agents(agent_dicts)
+        blocks = [[False] * 3 for _ in range(3)]
+        size = 3
+        
+        result = cbs(agents, blocks, size, max_time=20)
+        assert result["metrics"]["success"] == True
+        optimal = result["metrics"]["sum_of_costs"]
+        
+        bounded = cbs(agents, blocks, size, max_time=20, cost_upper_bound=optimal + 1)
+        assert bounded["metrics"]["success"] == True
+        assert bounded["metrics"]["sum_of_costs"] == optimal
+        
+        too_tight = cbs(agents, blocks, size, max_time=20, cost_upper_bound=optimal)
+        assert too_tight["metrics"]["success"] == False
+    
+    def test_cbs_deterministic(self):
+        """Test: CBS returns the same solution on every run"""
+        agent_dicts = [
+            {"id": 0, "start": [0, 0], "goal": [2, 2]},
+            {"id": 1, "start": [2, 0], "goal": [0, 2]},
+            {"id": 2, "start": [1, 0], "goal": [1, 2]}
+        ]
+        agents = convert_agents(agent_dicts)
+        blocks = [[False] * 3 for _ in range(3)]
+        
+        first = cbs(agents, blocks, 3, max_time=20)
+        second = cbs(agents, blocks, 3, max_time=20)
+        assert first["metrics"]["success"] == True
+        assert first["paths"] == second["paths"]
+        assert first["metrics"]["cbs_iterations"] == second["metrics"]["cbs_iterations"]
+    
     def test_metrics_calculation(self):
         """Test: Metrics are calculated correctly"""
         agent_dicts = [{"id": 0, "start": [0, 0], "goal": [0, 2]}]
@@ -213,6 +292,126 @@ class TestEdgeCases:
         result = independent_astar(agents, blocks, size)
         assert result["metrics"]["success"] == True
         assert result["metrics"]["time_taken_ms"] < 5000  # Should complete in <5s
+    
+    def test_parallel_independent_matches_sequential(self, monkeypatch):
+        """Test: Parallel per-agent planning returns the sequential result"""
+        # Force the pool for this small grid
+        monkeypatch.setattr(ia_module, "PARALLEL_MIN_WORK", 0)
+        agent_dicts = [
+            {"id": i, "start": [i, 0], "goal": [7 - i, 7]} for i in range(4)
+        ]
+        agents = convert_agents(agent_dicts)
+        blocks = [[False] * 8 for _ in range(8)]
+        size = 8
+        
+        sequential = independent_astar(agents, blocks, size, parallel=False)
+        parallel = independent_astar(agents, blocks, size, parallel=True)
+        assert parallel["paths"] == sequential["paths"]
+        assert parallel["metrics"]["sum_of_costs"] == sequential["metrics"]["sum_of_costs"]
+
+
+class TestSpaceTimeAStar:
+    """Test the low-level space-time A* planner"""
+    
+    def test_python_fallback_matches_numba(self, monkeypatch):
+        """Test: Pure-Python search returns the same result as the Numba kernel"""
+        if not st_module.NUMBA_AVAILABLE:
+            pytest.skip("numba not installed")
+        
+        agent = Agent(id=0, start=Pair(0, 0), goal=Pair(4, 4))
+        blocks = [[False] * 5 for _ in range(5)]
+        blocks[1][1] = True
+        blocks[2][3] = True
+        constraints = {st_module.encode_state(x, y, t, 5) for x, y, t in [(0, 1, 1), (1, 0, 1), (2, 2, 4)]}
+        
+        fast = st_module.space_time_astar(agent, blocks, 5, 20, constraints=constraints, track_exploration=True)
+        monkeypatch.setattr(st_module, "NUMBA_AVAILABLE", False)
+        slow = st_module.space_time_astar(agent, blocks, 5, 20, constraints=constraints, track_exploration=True)
+        
+        assert fast["path"] == slow["path"]
+        assert np.array_equal(fast["exploration_order"], slow["exploration_order"])
+        assert len(fast["exploration_order"]) > 1
+        assert fast["metrics"]["nodes_expanded"] == slow["metrics"]["nodes_expanded"]
+    
+    def test_goal_from_time_without_reservations_matches_numba(self, monkeypatch):
+        """Test: goal_from_time alone is honoured the same way by both backends"""
+        if not st_module.NUMBA_AVAILABLE:
+            pytest.skip("numba not installed")
+        
+        agent = Agent(id=0, start=Pair(0, 0), goal=Pair(0, 4))
+        blocks = [[False] * 5 for _ in range(5)]
+        # (0, 2) is taken for good from t = 1, so the path must go around it
+        goal_from_time = {st_module.encode_cell(0, 2, 5): 1}
+        
+        fast = st_module.space_time_astar(agent, blocks, 5, 20, goal_from_time=goal_from_time)
+        monkeypatch.setattr(st_module, "NUMBA_AVAILABLE", False)
+        slow = st_module.space_time_astar(agent, blocks, 5, 20, goal_from_time=goal_from_time)
+        
+        assert fast["path"] == slow["path"]
+        assert [0, 2] not in [step[:2] for step in slow["path"]]
+    
+    @pytest.mark.parametrize("use_numba", [True, False])
+    @pytest.mark.parametrize("start, goal", [((100000, 100000), (4, 4)), ((7, 7), (2, 2)), ((-1, 0), (2, 2)), ((0, 0), (0, 5)), ((0, 0), (100000, 0)), ((0, 0), (-40000, 2))])
+    def test_off_grid_endpoints_have_no_path(self, monkeypatch, use_numba, start, goal):
+        """Test: Start or goal outside the grid yields no path on both backends"""
+        if use_numba and not st_module.NUMBA_AVAILABLE:
+            pytest.skip("numba not installed")
+        monkeypatch.setattr(st_module, "NUMBA_AVAILABLE", use_numba)
+        
+        agent = Agent(id=0, start=Pair(*start), goal=Pair(*goal))
+        result = st_module.space_time_astar(agent, [[False] * 5 for _ in range(5)], 5)
+        assert result["path"] is None
+        assert result["metrics"]["success"] == False
+        
+        assert cbs([agent], [[False] * 5 for _ in range(5)], 5)["metrics"]["success"] == False
+        assert independent_astar([agent], [[False] * 5 for _ in range(5)], 5)["metrics"]["success"] == False
+        assert cooperative_astar([agent], [[False] * 5 for _ in range(5)], 5)["metrics"]["success"] == False
+    
+    @pytest.mark.parametrize("use_numba", [True, False])
+    def test_memory_independent_of_horizon(self, monkeypatch, use_numba):
+        """Test: A short search under a huge max_time does not size by the horizon"""
+        if use_numba and not st_module.NUMBA_AVAILABLE:
+            pytest.skip("numba not installed")
+        monkeypatch.setattr(st_module, "NUMBA_AVAILABLE", use_numba)
+        
+        agent = Agent(id=0, start=Pair(0, 0), goal=Pair(0, 3))
+        # A dense state table would need 3600 * 10**8 entries
+        result = st_module.space_time_astar(agent, [[False] * 60 for _ in range(60)], 60, 10**8)
+        assert result["metrics"]["path_length"] == 3
+    
+    @pytest.mark.parametrize("use_numba", [True, False])
+    def test_exploration_times_beyond_int16(self, monkeypatch, use_numba):
+        """Test: Exploration times past 32767 are reported exactly"""
+        if use_numba and not st_module.NUMBA_AVAILABLE:
+            pytest.skip("numba not installed")
+        monkeypatch.setattr(st_module, "NUMBA_AVAILABLE", use_numba)
+        
+        # Start walled into its own cell, so the search only waits until max_time
+        blocks = [[False] * 4 for _ in range(4)]
+        blocks[0][1] = True
+        blocks[1][0] = True
+        agent = Agent(id=0, start=Pair(0, 0), goal=Pair(3, 3))
+        result = st_module.space_time_astar(agent, blocks, 4, 40000, track_exploration=True)
+        
+        assert result["path"] is None
+        # f = t + h must stay within max_time, so the last wait is at 40000 - 6
+        assert result["exploration_order"][:, 2].max() == 40000 - 6
+    
+    @pytest.mark.parametrize("use_numba", [True, False])
+    def test_true_distance_heuristic(self, monkeypatch, use_numba):
+        """Test: BFS heuristic accounts for walls and marks unreachable cells"""
+        if use_numba and not st_module.NUMBA_AVAILABLE:
+            pytest.skip("numba not installed")
+        monkeypatch.setattr(st_module, "NUMBA_AVAILABLE", use_numba)
+        
+        blocks = [[False] * 3 for _ in range(3)]
+        blocks[0][1] = True
+        blocks[1][1] = True
+        
+        h = st_module.build_true_distance_heuristic(Pair(0, 2), blocks, 3)
+        assert h[0, 2] == 0
+        assert h[0, 0] == 6  # Around the wall via row 2, not Manhattan 2
+        assert h[0, 1] == st_module.HEURISTIC_INF  # Obstacle cell
 
 
 if __name__ == "__main__":
@@ -4,16 +4,14 @@ Tests API endpoints, request/response format, error handling.
 """
 
 import pytest
-from fastapi.testclient import TestClient
-from server import app
-
-client = TestClient(app)
+from utils import pack_grid
+from server import cors_origins
 
 
 class TestAPIEndpoints:
     """Test REST API endpoints"""
     
-    def test_generate_scenario_valid(self):
+    def test_generate_scenario_valid(self, client):
         """Test: Valid scenario generation request"""
         response = client.post("/api/generate-scenario", json={
             "size": 10,
@@ -29,7 +27,7 @@ class TestAPIEndpoints:
         assert len(data["blocks"]) == 10
         assert len(data["agents"]) == 2
     
-    def test_generate_scenario_invalid_size(self):
+    def test_generate_scenario_invalid_size(self, client):
         """Test: Invalid grid size (should reject)"""
         response = client.post("/api/generate-scenario", json={
             "size": 100,  # Too large
@@ -40,10 +38,27 @@ class TestAPIEndpoints:
         # Should either reject or handle gracefully
         assert response.status_code in [200, 400, 422]
     
-    def test_run_algorithm_independent(self):
+    def test_generate_scenario_seeded(self, client):
+        """Test: Same seed reproduces the same scenario"""
+        request = {
+            "size": 10,
+            "num_agents": 3,
+            "obstacle_percentage": 0.3,
+            "seed": 42
+        }
+        first = client.post("/api/generate-scenario", json=request).json()
+        second = client.post("/api/generate-scenario", json=request).json()
+        
+        assert first == second
+        assert sum(map(sum, first["blocks"])) == 30
+        cells = [tuple(a["start"]) for a in first["agents"]] + [tuple(a["goal"]) for a in first["agents"]]
+        assert len(set(cells)) == 6
+        assert not any(first["blocks"][r][c] for r, c in cells)
+    
+    def test_run_algorithm_independent(self, client, empty_grid_5):
         """Test: Run Independent A* algorithm"""
         response = client.post("/api/run-algorithm", json={
-            "blocks": [[False] * 5 for _ in range(5)],
+            "blocks": empty_grid_5,
             "agents": [
                 {"id": 0, "start": [0, 0], "goal": [4, 4]},
                 {"id": 1, "start": [0, 4], "goal": [4, 0]}
@@ -61,10 +76,10 @@ class TestAPIEndpoints:
         assert "conflicts" in data
         assert data["metrics"]["success"] == True
     
-    def test_run_algorithm_cooperative(self):
+    def test_run_algorithm_cooperative(self, client, empty_grid_5):
         """Test: Run Cooperative A* algorithm"""
         response = client.post("/api/run-algorithm", json={
-            "blocks": [[False] * 5 for _ in range(5)],
+            "blocks": empty_grid_5,
             "agents": [
                 {"id": 0, "start": [0, 0], "goal": [4, 4]},
                 {"id": 1, "start": [0, 4], "goal": [4, 0]}
@@ -78,10 +93,10 @@ class TestAPIEndpoints:
         data = response.json()
         assert data["metrics"]["num_conflicts"] == 0  # Should avoid conflicts
     
-    def test_run_algorithm_cbs(self):
+    def test_run_algorithm_cbs(self, client, empty_grid_5):
         """Test: Run CBS algorithm"""
         response = client.post("/api/run-algorithm", json={
-            "blocks": [[False] * 5 for _ in range(5)],
+            "blocks": empty_grid_5,
             "agents": [{"id": 0, "start": [0, 0], "goal": [2, 2]}],
             "size": 5,
             "algorithm": "cbs",
@@ -92,10 +107,10 @@ class TestAPIEndpoints:
         data = response.json()
         assert "metrics" in data
     
-    def test_run_algorithm_mip(self):
+    def test_run_algorithm_mip(self, client, empty_grid_3):
         """Test: Run MIP algorithm"""
         response = client.post("/api/run-algorithm", json={
-            "blocks": [[False] * 3 for _ in range(3)],
+            "blocks": empty_grid_3,
             "agents": [{"id": 0, "start": [0, 0], "goal": [2, 2]}],
             "size": 3,
             "algorithm": "mip",
@@ -106,10 +121,10 @@ class TestAPIEndpoints:
         data = response.json()
         assert "metrics" in data
     
-    def test_invalid_algorithm(self):
+    def test_invalid_algorithm(self, client, empty_grid_5):
         """Test: Invalid algorithm name"""
         response = client.post("/api/run-algorithm", json={
-            "blocks": [[False] * 5 for _ in range(5)],
+            "blocks": empty_grid_5,
             "agents": [{"id": 0, "start": [0, 0], "goal": [2, 2]}],
             "size": 5,
             "algorithm": "nonexistent",
@@ -122,7 +137,7 @@ class TestAPIEndpoints:
         data = response.json()
         assert "metrics" in data or "error" in data
     
-    def test_cors_headers(self):
+    def test_cors_headers(self, client):
         """Test: CORS headers are present"""
         response = client.get("/api/generate-scenario")
         
@@ -130,10 +145,28 @@ class TestAPIEndpoints:
         # OPTIONS may return 405, so just check headers exist on GET
         assert response.status_code in [200, 405, 422]  # 422 if missing body
     
-    def test_response_format(self):
+    def test_cors_allows_frontend_origin_only(self, client):
+        """Test: Preflight succeeds for the frontend and fails for other sites"""
+        headers = {"Access-Control-Request-Method": "POST"}
+        
+        allowed = client.options("/api/run-algorithm", headers={**headers, "Origin": "http://localhost:5173"})
+        assert allowed.status_code == 200
+        assert allowed.headers["access-control-allow-origin"] == "http://localhost:5173"
+        
+        denied = client.options("/api/run-algorithm", headers={**headers, "Origin": "http://evil.example"})
+        assert denied.status_code == 400
+    
+    def test_cors_configured_origins_are_exclusive(self):
+        """Test: A set FRONTEND_ORIGIN is the whole allow-list"""
+        configured = cors_origins("https://mapf.example, https://www.mapf.example")
+        assert configured["allow_origins"] == ["https://mapf.example", "https://www.mapf.example"]
+        assert configured["allow_origin_regex"] is None
+        assert cors_origins(None)["allow_origin_regex"] is not None
+    
+    def test_response_format(self, client, empty_grid_3):
         """Test: Response has correct JSON format"""
         response = client.post("/api/run-algorithm", json={
-            "blocks": [[False] * 3 for _ in range(3)],
+            "blocks": empty_grid_3,
             "agents": [{"id": 0, "start": [0, 0], "goal": [2, 2]}],
             "size": 3,
             "algorithm": "independent",
@@ -149,15 +182,35 @@ class TestAPIEndpoints:
         assert isinstance(data["metrics"]["success"], bool)
         assert isinstance(data["metrics"]["sum_of_costs"], int)
         assert isinstance(data["metrics"]["makespan"], int)
+    
+    def test_packed_blocks_match_list_blocks(self, client):
+        """Test: blocks_b64 yields the same result as the nested-list grid"""
+        blocks = [[False] * 5 for _ in range(5)]
+        blocks[1][1] = blocks[2][3] = blocks[3][1] = True
+        request = {
+            "agents": [
+                {"id": 0, "start": [0, 0], "goal": [4, 4]},
+                {"id": 1, "start": [4, 0], "goal": [0, 4]}
+            ],
+            "size": 5,
+            "algorithm": "cbs",
+            "max_time": 50
+        }
+        
+        packed = client.post("/api/run-algorithm", json={**request, "blocks_b64": pack_grid(blocks)})
+        nested = client.post("/api/run-algorithm", json={**request, "blocks": blocks})
+        
+        assert packed.status_code == 200
+        assert packed.json()["paths"] == nested.json()["paths"]
 
 
 class TestErrorHandling:
     """Test error handling and edge cases"""
     
-    def test_missing_required_fields(self):
+    def test_missing_required_fields(self, client, empty_grid_5):
         """Test: Request missing required fields"""
         response = client.post("/api/run-algorithm", json={
-            "blocks": [[False] * 5 for _ in range(5)],
+            "blocks": empty_grid_5,
             # Missing agents
             "size": 5,
             "algorithm": "independent"
@@ -165,10 +218,10 @@ class TestErrorHandling:
         
         assert response.status_code == 422  # Validation error
     
-    def test_empty_agents_list(self):
+    def test_empty_agents_list(self, client, empty_grid_5):
         """Test: Empty agents list"""
         response = client.post("/api/run-algorithm", json={
-            "blocks": [[False] * 5 for _ in range(5)],
+            "blocks": empty_grid_5,
             "agents": [],
             "size": 5,
             "algorithm": "independent",
@@ -177,6 +230,31 @@ class TestErrorHandling:
         
         # Should handle gracefully
         assert response.status_code in [200, 400]
+    
+    def test_missing_or_malformed_grid(self, client):
+        """Test: A grid is required and packed grids must be complete"""
+        request = {
+            "agents": [{"id": 0, "start": [0, 0], "goal": [2, 2]}],
+            "size": 5,
+            "algorithm": "independent"
+        }
+        
+        assert client.post("/api/run-algorithm", json=request).status_code == 422
+        short = pack_grid([[False] * 3 for _ in range(3)])  # 16 bits < 25
+        response = client.post("/api/run-algorithm", json={**request, "blocks_b64": short})
+        assert response.status_code == 422
+    
+    
+    def test_agent_outside_grid(self, client, empty_grid_5):
+        """Test: Agents with off-grid start or goal are rejected"""
+        for start, goal in [([100000, 100000], [4, 4]), ([-1, 0], [2, 2]), ([0, 0], [0, 5])]:
+            response = client.post("/api/run-algorithm", json={
+                "blocks": empty_grid_5,
+                "agents": [{"id": 0, "start": start, "goal": goal}],
+                "size": 5,
+                "algorithm": "cbs"
+            })
+            assert response.status_code == 422
 
 
 if __name__ == "__main__":
@@ -1,19 +1,14 @@
 from dataclasses import dataclass
-from typing import List, Any, Tuple
+from typing import List, Any, Tuple, NamedTuple
+import base64
 import math
+import numpy as np
 
-@dataclass
-class Pair:
+class Pair(NamedTuple):
     first: int
     second: int
-    
-    def __eq__(self, other):
-        return self.first == other.first and self.second == other.second
-    
-    def __hash__(self):
-        return hash((self.first, self.second))
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Agent:
     id: int
     start: Pair
@@ -22,33 +17,70 @@ class Agent:
     def __hash__(self):
         return hash(self.id)
 
-class PriorityQueueItem:
-    def __init__(self, priority: float, item: Any):
-        self.priority = priority
-        self.item = item
-
-    def __lt__(self, other):
-        return self.priority < other.priority
-
 def make_2d_array(size: int, default_value: Any) -> List[List[Any]]:
     return [[default_value for _ in range(size)] for _ in range(size)]
 
-def is_safe(x: int, y: int, size: int, blocks: List[List[bool]]) -> bool:
-    return 0 <= x < size and 0 <= y < size and not blocks[x][y]
+def as_grid(blocks: Any) -> np.ndarray:
+    """Obstacle grid as a C-contiguous (size, size) uint8 array (no copy if already one)"""
+    return np.ascontiguousarray(blocks, dtype=np.uint8)
 
-def get_neighbors(pos: Pair, blocks: List[List[bool]], size: int) -> List[Pair]:
-    """Get valid neighboring cells (4-directional movement)"""
-    neighbors = []
-    directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]  # N, E, S, W
-    
-    for dx, dy in directions:
-        x = pos.first + dx
-        y = pos.second + dy
-        if is_safe(x, y, size, blocks):
-            neighbors.append(Pair(x, y))
+def flat_grid(blocks: Any) -> bytes:
+    """Obstacle grid flattened row-major to size * size bytes, indexed by cell key"""
+    return as_grid(blocks).tobytes()
+
+def pack_grid(blocks: Any) -> str:
+    """Grid as base64 of its row-major cells packed 8 per byte, first cell in the high bit"""
+    return base64.b64encode(np.packbits(as_grid(blocks).ravel() != 0)).decode('ascii')
+
+def unpack_grid(data: str, size: int) -> np.ndarray:
+    """Inverse of pack_grid, as a (size, size) uint8 grid; ValueError if malformed"""
+    packed = np.frombuffer(base64.b64decode(data, validate=True), dtype=np.uint8)
+    if packed.size * 8 < size * size:
+        raise ValueError(f"packed grid has {packed.size * 8} bits, need {size * size}")
+    return np.unpackbits(packed, count=size * size).reshape(size, size)
+
+def in_bounds(x: int, y: int, size: int) -> bool:
+    return 0 <= x < size and 0 <= y < size
+
+def is_safe(x: int, y: int, size: int, blocks_flat: bytes) -> bool:
+    return 0 <= x < size and 0 <= y < size and not blocks_flat[x * size + y]
+
+def encode_cell(r: int, c: int, size: int) -> int:
+    """Pack a grid cell (r, c) into a single int key"""
+    return r * size + c
+
+def decode_cell(key: int, size: int) -> Tuple[int, int]:
+    """Inverse of encode_cell"""
+    return divmod(key, size)
+
+def neighbors_encoded(key: int, size: int, blocks_flat: bytes) -> List[int]:
+    """
+    Valid neighboring cell keys (4-directional movement, N, E, S, W)
     
+    blocks_flat is the grid as returned by flat_grid.
+    """
+    r, c = divmod(key, size)
+    neighbors = []
+    if c + 1 < size and not blocks_flat[key + 1]:
+        neighbors.append(key + 1)
+    if r + 1 < size and not blocks_flat[key + size]:
+        neighbors.append(key + size)
+    if c > 0 and not blocks_flat[key - 1]:
+        neighbors.append(key - 1)
+    if r > 0 and not blocks_flat[key - size]:
+        neighbors.append(key - size)
     return neighbors
 
+def build_neighbors_table(blocks: np.ndarray, size: int) -> List[Tuple[int, ...]]:
+    """
+    Precompute neighbors_encoded for every cell
+    
+    Returns:
+        table[cell_key] = tuple of neighboring cell keys
+    """
+    blocks_flat = flat_grid(blocks)
+    return [tuple(neighbors_encoded(key, size, blocks_flat)) for key in range(size * size)]
+
 def manhattan_distance(a: Pair, b: Pair) -> int:
     """Manhattan distance heuristic"""
     return abs(a.first - b.first) + abs(a.second - b.second)
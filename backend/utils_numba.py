@@ -0,0 +1,78 @@
+"""
+Numba-compiled grid primitives
+Fall back to plain Python when numba is not installed
+"""
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit, with or without arguments"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+# Direction constants (N, E, S, W), same order as utils.DX_4D / DY_4D
+DX_4D = np.array([0, 1, 0, -1], dtype=np.int8)
+DY_4D = np.array([1, 0, -1, 0], dtype=np.int8)
+
+@njit(cache=True)
+def neighbors(x, y, blocks):
+    """
+    Free 4-connected neighbors of (x, y) on a (size, size) uint8 grid
+    
+    Returns:
+        (4, 2) int32 array whose first `count` rows are the neighbors, and count
+    """
+    size = np.uint32(blocks.shape[0])
+    out = np.empty((4, 2), dtype=np.int32)
+    count = 0
+    for d in range(4):
+        nx = np.int64(x) + DX_4D[d]
+        ny = np.int64(y) + DY_4D[d]
+        # Negative coordinates wrap to huge unsigned values, so one
+        # unsigned compare per axis covers both bounds
+        if np.uint32(nx) < size and np.uint32(ny) < size and not blocks[nx, ny]:
+            out[count, 0] = nx
+            out[count, 1] = ny
+            count += 1
+    return out, count
+
+@njit(cache=True)
+def bfs_distances(gx, gy, blocks, unreachable):
+    """
+    Obstacle-aware BFS distance from (gx, gy) to every cell of the grid
+    
+    Returns:
+        (size, size) int16 array, `unreachable` where no path exists
+    """
+    size = blocks.shape[0]
+    dist = np.full((size, size), unreachable, dtype=np.int16)
+    queue = np.empty((size * size, 2), dtype=np.int32)
+    dist[gx, gy] = 0
+    queue[0, 0] = gx
+    queue[0, 1] = gy
+    head = 0
+    tail = 1
+    while head < tail:
+        x = queue[head, 0]
+        y = queue[head, 1]
+        head += 1
+        d = dist[x, y] + 1
+        out, count = neighbors(x, y, blocks)
+        for i in range(count):
+            nx = out[i, 0]
+            ny = out[i, 1]
+            if dist[nx, ny] == unreachable:
+                dist[nx, ny] = d
+                queue[tail, 0] = nx
+                queue[tail, 1] = ny
+                tail += 1
+    return dist
+
+# Compile (or load from cache) at import so the first request doesn't pay for it
+bfs_distances(0, 0, np.zeros((1, 1), dtype=np.uint8), np.iinfo(np.int16).max)
@@ -12,6 +12,7 @@ import { sleep } from './utils';
 import {
   generateScenario,
   runAlgorithm,
+  packBlocks,
   type Agent,
   type RunAlgorithmResponse,
 } from './services/mapfService';
@@ -399,7 +400,7 @@ class MAPFApp {
     
     try {
       const result = await runAlgorithm({
-        blocks: this.blocks,
+        blocks_b64: packBlocks(this.blocks),
         agents: this.agents,
         size: this.size,
         algorithm: algorithm,
@@ -441,14 +442,14 @@ class MAPFApp {
       // Run both algorithms
       const [leftResult, rightResult] = await Promise.all([
         runAlgorithm({
-          blocks: this.blocks,
+          blocks_b64: packBlocks(this.blocks),
           agents: this.agents,
           size: this.size,
           algorithm: this.leftAlgorithm,
           max_time: 100,
         }),
         runAlgorithm({
-          blocks: this.blocks,
+          blocks_b64: packBlocks(this.blocks),
           agents: this.agents,
           size: this.size,
           algorithm: this.rightAlgorithm,
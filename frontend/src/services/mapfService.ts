@@ -20,7 +20,9 @@ export interface GenerateScenarioResponse {
 }
 
 export interface RunAlgorithmRequest {
-  blocks: boolean[][];
+  // Grid packed with packBlocks; the nested `blocks` form is deprecated
+  blocks_b64?: string;
+  blocks?: boolean[][];
   agents: Agent[];
   size: number;
   algorithm: string;
@@ -43,6 +45,17 @@ export interface RunAlgorithmResponse {
   conflicts: any[];
 }
 
+// Pack the grid row-major, 8 cells per byte (first cell in the high bit),
+// as base64 -- the backend decodes this in one call (utils.unpack_grid)
+export function packBlocks(blocks: boolean[][]): string {
+  const cells = blocks.flat();
+  const bytes = new Uint8Array(Math.ceil(cells.length / 8));
+  cells.forEach((blocked, i) => {
+    if (blocked) bytes[i >> 3] |= 0x80 >> (i & 7);
+  });
+  return btoa(String.fromCharCode(...bytes));
+}
+
 export async function generateScenario(
   request: GenerateScenarioRequest
 ): Promise<GenerateScenarioResponse> {